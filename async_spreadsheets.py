@@ -0,0 +1,381 @@
+"""Module for making google sheets requests concurrently with asyncio, alongside spreadsheets.
+
+A Client sends requests to the Sheets REST API through one shared pool of HTTP connections,
+with at most concurrent_requests in flight, e.g.,
+
+    async with async_spreadsheets.Client() as client:
+        yesterday, carrier_push = await asyncio.gather(
+            client.get(spreadsheet_id, 'B3:B47'),
+            client.get(carrier_push_id, 'Carrier Push'))
+
+Requests answered with 429 or 5xx are retried spreadsheets.num_retries times, waiting as long as
+Retry-After asks or backing off exponentially. aiohttp is used when it is installed, otherwise
+requests are sent from threads over kept-alive http.client connections. Updates share the write
+cache of spreadsheets, and while spreadsheets uses a stand-in service, e.g., a LocalService,
+requests are made to it instead.
+"""
+
+
+# Import Modules
+import asyncio
+import http.client
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode, urlsplit
+import instrument
+import spreadsheets
+
+
+logger = logging.getLogger(__name__)
+
+# Sheets REST API root, can point to a proxy or a fake server
+sheets_url = 'https://sheets.googleapis.com/v4/spreadsheets'
+
+# Most requests in flight at once per Client, also the size of its connection pool
+concurrent_requests = 10
+
+# Seconds before a request times out, and backoff of retries, which doubles up to max_backoff
+timeout = 60
+backoff = 1.0
+max_backoff = 32.0
+
+# Use aiohttp when it is installed, else http.client connections in threads
+use_aiohttp = True
+
+# Statuses retried with backoff
+retry_statuses = {429, 500, 502, 503, 504}
+
+
+class _ThreadTransport:
+    """Sends requests from threads, reusing http.client connections kept alive per host."""
+
+    errors = (OSError, http.client.HTTPException)
+
+    def __init__(self, size):
+        self.executor = ThreadPoolExecutor(size, thread_name_prefix='sheets')
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def _connection(self, scheme, netloc):
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=timeout)
+        return http.client.HTTPConnection(netloc, timeout=timeout)
+
+    def _send(self, method, url, body, headers):
+        parts = urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        connection = self._connection(parts.scheme, parts.netloc)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            with self.lock:
+                self.idle.setdefault((parts.scheme, parts.netloc), []).append(connection)
+        return response.status, dict(response.getheaders()), data
+
+    async def request(self, method, url, body, headers):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._send, method, url, body, headers)
+
+    async def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+
+class _AiohttpTransport:
+    """Sends requests with one aiohttp session, its connector is the connection pool."""
+
+    def __init__(self, size):
+        import aiohttp
+        self.aiohttp = aiohttp
+        self.errors = (OSError, asyncio.TimeoutError, aiohttp.ClientError)
+        self.size = size
+        self.session = None
+
+    async def request(self, method, url, body, headers):
+        if self.session is None:
+            self.session = self.aiohttp.ClientSession(
+                connector=self.aiohttp.TCPConnector(limit=self.size),
+                timeout=self.aiohttp.ClientTimeout(total=timeout))
+        async with self.session.request(method, url, data=body, headers=headers) as response:
+            return response.status, dict(response.headers), await response.read()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+def _transport(size):
+    """Returns an aiohttp transport if use_aiohttp and it is installed, else a thread transport."""
+
+    if use_aiohttp:
+        try:
+            return _AiohttpTransport(size)
+        except ImportError:
+            pass
+    return _ThreadTransport(size)
+
+
+class Client:
+    """Sends Sheets values requests concurrently, see the module docstring.
+
+        Use it as an async context manager, or call close, to close its connections. A Client
+        belongs to the event loop it is first used in.
+
+        Args:
+            base_url(str): Sheets REST API root, defaults to sheets_url.
+            max_concurrency(int): Most requests in flight at once, defaults to concurrent_requests.
+            token(str or callable): Access token, or a function returning one, defaults to the
+                token of spreadsheets.credentials, refreshed when it expires.
+    """
+
+    def __init__(self, base_url=None, max_concurrency=None, token=None):
+        self.base_url = (base_url or sheets_url).rstrip('/')
+        self.max_concurrency = max_concurrency or concurrent_requests
+        self.token = token
+        self._semaphore = None
+        self._transport = None
+        self._executor = None
+        self._refresh_lock = None
+
+    def __repr__(self):
+        return 'Client({0!r}, max_concurrency={1!r})'.format(self.base_url, self.max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Closes the connections of the client."""
+
+        if self._transport is not None:
+            await self._transport.close()
+            self._transport = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _start(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._refresh_lock = asyncio.Lock()
+        if self._transport is None:
+            self._transport = _transport(self.max_concurrency)
+
+    async def _token(self, refresh=False):
+        """Returns the access token, refreshing the credentials in a thread if it expired."""
+
+        if self.token is not None:
+            return self.token() if callable(self.token) else self.token
+
+        credentials = spreadsheets.credentials()
+        async with self._refresh_lock:
+            if refresh or not credentials.valid:
+                from google.auth.transport.requests import Request
+                await asyncio.get_running_loop().run_in_executor(None, credentials.refresh, Request())
+        return credentials.token
+
+    def _delay(self, attempt, headers):
+        """Returns the seconds to wait before retry attempt, Retry-After if the response has one.
+
+            Waits are at most max_backoff, however long Retry-After asks for.
+        """
+
+        retry_after = {key.lower(): value for key, value in headers.items()}.get('retry-after')
+        if retry_after is not None:
+            try:
+                return min(max_backoff, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        return min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def _request(self, name, method, spreadsheet_id, path, params=None, body=None):
+        """Sends a request with retries, measured as an API call named 'spreadsheets.' + name."""
+
+        self._start()
+        url = '{0}/{1}{2}'.format(self.base_url, quote(spreadsheet_id, safe=''), path)
+        if params:
+            url += '?' + urlencode(params, doseq=True)
+        payload = json.dumps(body, default=str).encode() if body is not None else None
+        refreshed = False
+
+        for attempt in range(spreadsheets.num_retries + 1):
+            headers = {'Authorization': 'Bearer {0}'.format(await self._token()), 'Content-Type': 'application/json'}
+
+            # The semaphore is released while backing off, so other requests can go ahead
+            async with self._semaphore:
+                start = time.perf_counter()
+                try:
+                    status, response_headers, data = await self._transport.request(method, url, payload, headers)
+                    error = None
+                except self._transport.errors as failure:
+                    status, response_headers, data, error = None, {}, b'', failure
+                instrument.record('spreadsheets.' + name, time.perf_counter() - start,
+                                  bytes_=len(payload or b'') + len(data), api_calls=1)
+
+            if status is not None and status < 300:
+                return json.loads(data) if data else {}
+            if status == 401 and self.token is None and not refreshed:
+                await self._token(refresh=True)
+                refreshed = True
+                continue
+            if status is not None and status not in retry_statuses:
+                raise Exception('Sheets {0} failed with {1}: {2}'.format(name, status, data.decode(errors='replace')[:500]))
+            if attempt == spreadsheets.num_retries:
+                raise Exception('Sheets {0} failed after {1} retries: {2}'.format(name, attempt, error or status))
+
+            delay = self._delay(attempt, response_headers)
+            logger.info('Retrying sheets %s in %.1f seconds after %s', name, delay, error or status)
+            await asyncio.sleep(delay)
+
+    async def _stand_in(self, name, service_, method, **kwargs):
+        """Executes a request of a stand-in service in a thread, see spreadsheets.use_service."""
+
+        self._start()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix='sheets')
+        request = getattr(service_.spreadsheets().values(), method)(**kwargs)
+        async with self._semaphore:
+            start = time.perf_counter()
+            response = await asyncio.get_running_loop().run_in_executor(self._executor, request.execute)
+            instrument.record('spreadsheets.' + name, time.perf_counter() - start, api_calls=1)
+        return response
+
+    async def get(self, spreadsheet_id, range_):
+        """Gets the values of range_, like spreadsheets.get."""
+
+        service_ = spreadsheets.stand_in()
+        if service_ is not None:
+            response = await self._stand_in('get', service_, 'get', spreadsheetId=spreadsheet_id, range=range_)
+        else:
+            response = await self._request('get', 'GET', spreadsheet_id, '/values/' + quote(range_, safe=''))
+        spreadsheets._record_reads([(spreadsheet_id, range_, response)])
+        return response
+
+    async def update(self, spreadsheet_id, range_, values, value_input_option='USER_ENTERED'):
+        """Writes values to range_, like spreadsheets.update, skipped if they are unchanged."""
+
+        if spreadsheets.unchanged(spreadsheet_id, range_, values, value_input_option):
+            return spreadsheets._skipped(spreadsheet_id, range_)
+
+        body = {'values': values}
+        service_ = spreadsheets.stand_in()
+        if service_ is not None:
+            response = await self._stand_in('update', service_, 'update', spreadsheetId=spreadsheet_id, range=range_,
+                                            valueInputOption=value_input_option, body=body)
+        else:
+            response = await self._request('update', 'PUT', spreadsheet_id, '/values/' + quote(range_, safe=''),
+                                           {'valueInputOption': value_input_option}, body)
+        spreadsheets._record_writes([(spreadsheet_id, range_, values, value_input_option)])
+        return response
+
+    async def clear(self, spreadsheet_id, range_):
+        """Clears range_, like spreadsheets.clear."""
+
+        service_ = spreadsheets.stand_in()
+        if service_ is not None:
+            response = await self._stand_in('clear', service_, 'clear', spreadsheetId=spreadsheet_id, range=range_, body={})
+        else:
+            response = await self._request('clear', 'POST', spreadsheet_id, '/values/' + quote(range_, safe='') + ':clear', body={})
+        spreadsheets._record_clears([(spreadsheet_id, range_)])
+        return response
+
+    async def batch_get(self, spreadsheet_id, ranges):
+        """Gets the values of ranges in one request, returns the batchGet response."""
+
+        ranges = list(ranges)
+        service_ = spreadsheets.stand_in()
+        if service_ is not None:
+            response = await self._stand_in('batchGet', service_, 'batchGet', spreadsheetId=spreadsheet_id, ranges=ranges)
+        else:
+            response = await self._request('batchGet', 'GET', spreadsheet_id, '/values:batchGet', {'ranges': ranges})
+        spreadsheets._record_reads(list(zip([spreadsheet_id] * len(ranges), ranges, response.get('valueRanges', []))))
+        return response
+
+    async def batch_update(self, spreadsheet_id, data, value_input_option='USER_ENTERED'):
+        """Writes data, a list of {'range': range, 'values': values list}, in one request.
+
+            Ranges whose values are unchanged are left out, the batchUpdate response has a
+            response per range of data in order, the skipped ones included.
+        """
+
+        data = list(data)
+        changed = spreadsheets._changed([], [(spreadsheet_id, x['range'], x['values'], value_input_option) for x in data])
+        sent = [x for x, send in zip(data, changed) if send]
+        response = {'spreadsheetId': spreadsheet_id, 'totalUpdatedCells': 0, 'responses': []}
+
+        if sent:
+            body = {'valueInputOption': value_input_option, 'data': sent}
+            service_ = spreadsheets.stand_in()
+            if service_ is not None:
+                response = await self._stand_in('batchUpdate', service_, 'batchUpdate', spreadsheetId=spreadsheet_id, body=body)
+            else:
+                response = await self._request('batchUpdate', 'POST', spreadsheet_id, '/values:batchUpdate', body=body)
+            spreadsheets._record_writes([(spreadsheet_id, x['range'], x['values'], value_input_option) for x in sent])
+
+        answered = iter(response.get('responses', []))
+        sent_ids = {id(x) for x in sent}
+        response['responses'] = [next(answered, {}) if id(x) in sent_ids else spreadsheets._skipped(spreadsheet_id, x['range'])
+                                 for x in data]
+        return response
+
+    async def batch_clear(self, spreadsheet_id, ranges):
+        """Clears ranges in one request, returns the batchClear response."""
+
+        body = {'ranges': list(ranges)}
+        service_ = spreadsheets.stand_in()
+        if service_ is not None:
+            response = await self._stand_in('batchClear', service_, 'batchClear', spreadsheetId=spreadsheet_id, body=body)
+        else:
+            response = await self._request('batchClear', 'POST', spreadsheet_id, '/values:batchClear', body=body)
+        spreadsheets._record_clears([(spreadsheet_id, range_) for range_ in body['ranges']])
+        return response
+
+
+def run(coroutine):
+    """Runs coroutine to completion from blocking code and returns its result.
+
+        In a thread already running an event loop, e.g., a notebook, it runs in a new thread.
+    """
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result = {}
+
+    def target():
+        try:
+            result['value'] = asyncio.run(coroutine)
+        except BaseException as error:
+            result['error'] = error
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
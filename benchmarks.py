@@ -0,0 +1,576 @@
+"""Module to time the backlog reporting functions on generated data.
+
+Reports like the Oracle exports and a Carrier Push sheet are generated at any scale, written to
+a work folder and served by a spreadsheets.LocalService, so every stage can be timed offline.
+Run as a script to time each stage and append the results to benchmark_history, e.g.,
+
+    python benchmarks.py --lines 10000 100000 1000000
+"""
+
+# Import Modules
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import exporting
+import spreadsheets
+import toolbelt
+
+
+# Results of each run are appended here as a line of JSON, see history and compare
+benchmark_history = 'benchmarks.jsonl'
+
+# Seconds importing toolbelt may take, and modules it must leave to be imported when used,
+# see check_import
+import_budget = 1.0
+lazy_modules = ['googleapiclient', 'google.oauth2', 'IPython', 'async_spreadsheets', 'aiohttp']
+
+# Rows of an .xlsx sheet, larger reports are only timed in memory
+excel_rows = 1048576
+
+# Customers making up most of the backlog and their share of lines, the rest are spread over
+# generated names
+customers = {
+    'LOWES COMPANIES INC': 0.15,
+    'HOME DEPOT': 0.14,
+    'HOME DEPOT.COM': 0.05,
+    'MENARDS INC': 0.07,
+    'ACE HDW CORP': 0.07,
+    'ORGILL INC': 0.06,
+    'BLISH-MIZE CO': 0.02,
+    'PARAMIT MALAYSIA SDN BHD.': 0.01
+}
+sales_channels = {'DISTRIBUTORS': 0.3, 'GIANTS': 0.3, 'ECOMMERCE': 0.15, 'FIELD SALES': 0.1,
+                  'INTERNATIONAL': 0.05, 'OTHER': 0.05, 'RETAIL': 0.05}
+line_statuses = {'Booked': 0.3, 'Released': 0.2, 'Awaiting': 0.15, 'Ready': 0.15, 'Picked': 0.15, None: 0.05}
+shortage_categories = {'Covered': 0.6, 'Short': 0.25, None: 0.15}
+shipping_methods = {'LTL': 0.35, 'TL': 0.15, 'CUSTOMER PICKUP': 0.05, 'UPS GROUND': 0.3, 'FEDEX GROUND': 0.15}
+carrier_statuses = {'Carrier Delay': 0.35, 'Overage': 0.25, 'Transportation Management Delay': 0.25, 'Other': 0.15}
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    """Returns the best wall time in seconds of repeat calls to function."""
+    
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def carrier_status_table(pushes, order_numbers, seed=0):
+    """Generates a carrier_status table like get_carrier_status returns."""
+    
+    rng = np.random.default_rng(seed)
+    statuses = ['Carrier Delay', 'Overage', 'Transportation Management Delay', 'Other']
+    result = pd.DataFrame({
+        'ORDER_NUMBER': rng.choice(order_numbers, pushes),
+        'CARRIER_STATUS': rng.choice(statuses, pushes)
+    })
+    result = result.set_index('ORDER_NUMBER')
+    return result[~result.index.duplicated(keep='first')]
+
+
+def bench_carrier_status(lines=200000, pushes=(10, 100, 1000, 10000, 100000), reference_lines=2000, seed=0):
+    """Times attach_carrier_status against calc_carrier_status as Carrier Push rows grow.
+    
+        The row-wise reference is only timed on reference_lines lines and scaled up, since it
+        is too slow to run on a full extract.
+    """
+    
+    rng = np.random.default_rng(seed)
+    order_numbers = np.arange(10000000, 10000000 + lines // 4)
+    data = pd.DataFrame({'ORDER_NUMBER': rng.choice(order_numbers, lines)})
+    sample = data.head(reference_lines)
+    
+    results = []
+    for count in pushes:
+        carrier_status = carrier_status_table(count, order_numbers, seed)
+        join = timed(toolbelt.attach_carrier_status, data.copy(), carrier_status)
+        reference = timed(sample.apply, toolbelt.calc_carrier_status, axis=1, carrier_status=carrier_status, repeat=1)
+        results.append({
+            'pushes': count,
+            'join_seconds': join,
+            'reference_seconds': reference * lines / len(sample)
+        })
+    
+    return pd.DataFrame(results).set_index('pushes')
+
+
+def mixed_frame(rows=100000, columns=25, seed=0):
+    """Generates a frame of int, float, string, category and datetime columns."""
+    
+    rng = np.random.default_rng(seed)
+    names = np.array(['HOME DEPOT', 'LOWES COMPANIES INC', 'ORGILL INC', 'ACE HDW CORP', 'MENARDS INC'])
+    kinds = [
+        lambda: rng.integers(0, 100000, rows),
+        lambda: np.where(rng.random(rows) < 0.05, np.nan, rng.random(rows) * 1000),
+        lambda: rng.choice(names, rows).astype(object),
+        lambda: pd.Categorical(rng.choice(names, rows)),
+        lambda: pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    ]
+    return pd.DataFrame({'COLUMN_{0}'.format(i): kinds[i % len(kinds)]() for i in range(columns)})
+
+
+def bench_values(rows=100000, columns=25):
+    """Times spreadsheets.values and spreadsheets.df on a rows x columns frame."""
+    
+    frame = mixed_frame(rows, columns)
+    frame_values = spreadsheets.values(frame)
+    
+    return {
+        'values_seconds': timed(spreadsheets.values, frame),
+        'df_seconds': timed(spreadsheets.df, frame_values),
+        'df_memory_bytes': int(spreadsheets.df(frame_values).memory_usage(deep=True).sum()),
+        'df_untyped_memory_bytes': int(spreadsheets.df(frame_values, dtypes=False).memory_usage(deep=True).sum())
+    }
+
+
+def bench_process_1(latency=0.1):
+    """Times process_1 against a LocalService that waits latency seconds per request.
+    
+        Returns:
+            result(dict): Wall time in seconds and the requests made.
+    """
+    
+    spreadsheet_id = toolbelt.distribution_spreadsheets['Backlog Breakdown']
+    local = spreadsheets.LocalService({spreadsheet_id: {'Current': [[''] * 2] + [['', x] for x in range(3, 48)]}}, latency)
+    spreadsheets.use_service(local)
+    try:
+        seconds = timed(toolbelt.process_1, repeat=1)
+    finally:
+        spreadsheets.use_service(None)
+    
+    return {'seconds': seconds, 'calls': local.calls}
+
+
+def bench_get_ranges(ranges=8, latency=0.1):
+    """Times getting ranges ranges one after another and with toolbelt.get_ranges, against a
+        LocalService that waits latency seconds per request.
+    
+        Returns:
+            result(dict): Wall time in seconds of each way.
+    """
+    
+    spreadsheet_id = toolbelt.distribution_spreadsheets['Backlog Breakdown']
+    local = spreadsheets.LocalService({spreadsheet_id: {'Current': [['', x] for x in range(1, 48)]}}, latency)
+    wanted = {'B{0}'.format(x): (spreadsheet_id, 'Current!B{0}'.format(x)) for x in range(3, 3 + ranges)}
+    spreadsheets.use_service(local)
+    try:
+        sequential = timed(lambda: [spreadsheets.get(*x) for x in wanted.values()], repeat=1)
+        concurrent = timed(toolbelt.get_ranges, wanted, repeat=1)
+    finally:
+        spreadsheets.use_service(None)
+    
+    return {'sequential_seconds': sequential, 'concurrent_seconds': concurrent}
+
+
+def _choice(rng, weights, size):
+    """Draws size values from weights, a dict of value to share, as an object array."""
+    
+    values = np.empty(len(weights), dtype=object)
+    values[:] = list(weights)
+    shares = np.array(list(weights.values()), dtype=float)
+    return values[rng.choice(len(values), size, p=shares / shares.sum())]
+
+
+def open_orders(lines, seed=0, today='2024-06-03'):
+    """Generates an Open_Orders_Extract report of lines lines, as read returns it before fillna.
+    
+        Orders have about five lines, most lines go to a few large customers, and the ship dates
+        are spread over 60 days either side of today, those before today being Late.
+    """
+    
+    rng = np.random.default_rng(seed)
+    
+    # Customers, a tail of generated names takes the lines the large customers do not
+    tail = max(1, lines // 500)
+    names = dict(customers)
+    names.update({'CUSTOMER {0:05d}'.format(i): (1 - sum(customers.values())) / tail for i in range(tail)})
+    bill_to = _choice(rng, names, lines)
+    ship_to = pd.Series(bill_to).str.cat(pd.Series(rng.integers(1, 20, lines)).map(' - W {0:03d}'.format))
+    kilgore = (bill_to == 'ORGILL INC') & (rng.random(lines) < 0.3)
+    ship_to[kilgore] = 'ORGILL INC - KILGORE - W 006'
+    
+    # Items, each with a description
+    items = np.array(['{0:06d}'.format(x) for x in rng.choice(900000, max(100, min(20000, lines // 10)), replace=False)], dtype=object)
+    item_index = rng.zipf(1.3, lines) % len(items)
+    
+    shipping_method = _choice(rng, shipping_methods, lines)
+    ship_date = pd.Timestamp(today) + pd.to_timedelta(rng.integers(-60, 60, lines), unit='D')
+    cases = rng.poisson(3, lines) + 1
+    
+    return pd.DataFrame({
+        'SHIP_DATE_CATEGORY': np.where(ship_date < pd.Timestamp(today), 'Late', 'Future').astype(object),
+        'ORDER_NUMBER': 10000000 + rng.integers(0, max(1, lines // 5), lines),
+        'DOLLARS': np.round(rng.lognormal(5, 1.2, lines), 2),
+        'CASES': cases,
+        'ORG': _choice(rng, {'OK': 0.8, 'NO': 0.2}, lines),
+        'SALES_CHANNEL': _choice(rng, sales_channels, lines),
+        'BILL_TO_NAME': bill_to,
+        'SHIP_TO_NAME': ship_to.to_numpy(dtype=object),
+        'SHIP_DATE': ship_date,
+        'SHIPPING_METHOD': shipping_method,
+        'SHIPPING_CATEGORY': np.where(np.isin(shipping_method, ['LTL', 'TL', 'CUSTOMER PICKUP']), 'TRUCK', 'PARCEL').astype(object),
+        'LINE_STATUS': _choice(rng, line_statuses, lines),
+        'SHORTAGE_CATEGORY': _choice(rng, shortage_categories, lines),
+        'ITEM_NO': items[item_index],
+        'ITEM_DESCRIPTION': pd.Series(items[item_index]).radd('ITEM ').to_numpy(dtype=object),
+        'PIECE_QTY': cases * rng.choice([6, 12, 24], lines),
+        'Open Orders': cases,
+        'DISTRIBUTION_ONHAND': rng.integers(0, 5000, lines),
+        'RESERVED_QUANTITY': rng.integers(0, 200, lines)
+    })
+
+
+def backlog(lines, seed=0):
+    """Generates a Backlog report of lines dropship and standard lines, as read returns it before fillna."""
+    
+    rng = np.random.default_rng(seed)
+    names = dict(customers)
+    names['CUSTOMER 00000'] = 1 - sum(customers.values())
+    
+    return pd.DataFrame({
+        'Shipping Org': _choice(rng, {'OK': 0.8, 'NO': 0.2}, lines),
+        'Days Late': rng.integers(-10, 30, lines),
+        'Order Type': _choice(rng, {'VENDOR DROPSHIP': 0.3, 'STANDARD': 0.7}, lines),
+        'Bill To Customer': _choice(rng, names, lines),
+        'Sales Channel': _choice(rng, {'Distributors': 0.4, 'Giants': 0.4, 'Ecommerce': 0.2}, lines),
+        'Amount': np.round(rng.lognormal(6, 1, lines), 2)
+    })
+
+
+def carrier_push(order_numbers, pushes, seed=0):
+    """Generates the values list of a Carrier Push sheet pushing pushes of order_numbers."""
+    
+    rng = np.random.default_rng(seed)
+    orders = rng.choice(np.unique(order_numbers), min(pushes, len(np.unique(order_numbers))), replace=False)
+    statuses = _choice(rng, carrier_statuses, len(orders))
+    
+    return [['ORDER_NUMBER', 'CARRIER_STATUS', 'NOTES']] + [[str(x), y, ''] for x, y in zip(orders.tolist(), statuses)]
+
+
+def write_report(data, path):
+    """Writes data to path like the M-D reports, a title row then the headers on ReportOutput."""
+    
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame([[os.path.splitext(os.path.basename(path))[0]]]).to_excel(writer, sheet_name='ReportOutput', index=False, header=False)
+        data.to_excel(writer, sheet_name='ReportOutput', index=False, startrow=1)
+
+
+class Workspace:
+    """Generated reports in a work folder and a LocalService holding the sheets they use.
+    
+        Open_Orders_Extract.xlsx and Backlog.xlsx are only written when they fit a sheet, see
+        excel_rows. Use as a context manager to serve the sheets and delete the folder afterwards.
+    
+        Args:
+            lines(int): Open Orders lines, Backlog lines are a tenth.
+            folder(str): Work folder, a new temporary folder if None.
+            seed(int): Seed of the generators.
+            latency(float): Seconds each sheets request waits, see spreadsheets.LocalService.
+            files(bool): Write the .xlsx reports.
+    """
+    
+    def __init__(self, lines, folder=None, seed=0, latency=0.0, files=True):
+        self.lines = lines
+        self.temporary = folder is None
+        self.folder = folder or tempfile.mkdtemp(prefix='benchmarks_')
+        self.open_orders = open_orders(lines, seed)
+        self.backlog = backlog(max(10, lines // 10), seed)
+        self.carrier_push = carrier_push(self.open_orders['ORDER_NUMBER'], max(10, lines // 100), seed)
+        self.latency = latency
+        self.service = None
+        
+        self.files = files and lines < excel_rows
+        if self.files:
+            write_report(self.open_orders, self.path('Open_Orders_Extract.xlsx'))
+            write_report(self.backlog, self.path('Backlog.xlsx'))
+    
+    def path(self, name):
+        return os.path.join(self.folder, name)
+    
+    def sheets(self):
+        """Returns a new LocalService with the Carrier Push and Backlog Breakdown sheets."""
+        
+        return spreadsheets.LocalService({
+            toolbelt.distribution_spreadsheets['Carrier Push']: {'Carrier Push': self.carrier_push},
+            toolbelt.distribution_spreadsheets['Backlog Breakdown']: {'Current': [[''] * 2] + [['', x] for x in range(3, 48)]}
+        }, self.latency)
+    
+    def carrier_status(self):
+        """Returns the carrier_status table of the Carrier Push sheet, like get_carrier_status."""
+        
+        result = spreadsheets.df(self.carrier_push, index='ORDER_NUMBER')
+        result.index = result.index.astype(int)
+        return result[~result.index.duplicated(keep='first')]
+    
+    def serve(self):
+        """Makes spreadsheets use a new LocalService of sheets and returns it."""
+        
+        self.service = self.sheets()
+        spreadsheets.use_service(self.service)
+        toolbelt.carrier_status_table.clear()
+        return self.service
+    
+    def __enter__(self):
+        self.serve()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        spreadsheets.use_service(None)
+        toolbelt.carrier_status_table.clear()
+        if self.temporary:
+            shutil.rmtree(self.folder, ignore_errors=True)
+
+
+def cold():
+    """Forgets parsed reports and the carrier_status table, so the next run starts cold."""
+    
+    toolbelt._reports.clear()
+    toolbelt.carrier_status_table.clear()
+
+
+def bench_stages(workspace, repeat=3):
+    """Times each pipeline stage on workspace.
+    
+        read and program_2 need the .xlsx reports, see Workspace, and are left out without them.
+        program_2 runs in the work folder, cold, and writes Line Detail.xlsx there.
+    
+        Returns:
+            result(list): Dicts of benchmark, lines, seconds and the rows per second.
+    """
+    
+    data = workspace.open_orders.fillna(0)
+    backlog_data = workspace.backlog.fillna(0)
+    carrier_status = workspace.carrier_status()
+    p4_data = toolbelt.process_4(data=data, carrier_status=carrier_status, formats=())
+    dropships = toolbelt.process_2(data=backlog_data)
+    
+    benchmarks = {
+        'process_2': lambda: toolbelt.process_2(data=backlog_data),
+        'process_3': lambda: toolbelt.process_3(data=data),
+        'process_4': lambda: toolbelt.process_4(data=data, carrier_status=carrier_status, formats=()),
+        'process_4 compact': lambda: toolbelt.process_4(data=toolbelt.compact(workspace.open_orders, toolbelt.open_orders_schema),
+                                                        carrier_status=carrier_status, compact=True, formats=()),
+        'get_carrier_status': lambda: (toolbelt.carrier_status_table.clear(), toolbelt.get_carrier_status()),
+        'update_backlog_breakdown': lambda: (spreadsheets.forget(), toolbelt.update_backlog_breakdown(dropships, p4_data)),
+        'export csv': lambda: exporting.export(p4_data, workspace.path('Line Detail.csv')),
+    }
+    if workspace.files:
+        open_orders_path = workspace.path('Open_Orders_Extract.xlsx')
+        benchmarks['read'] = lambda: toolbelt.read('Open_Orders_Extract', open_orders_path, usecols=toolbelt.open_orders_columns, cache=False)
+        benchmarks['read compact'] = lambda: toolbelt.read('Open_Orders_Extract', open_orders_path, usecols=toolbelt.open_orders_columns,
+                                                           cache=False, schema=toolbelt.open_orders_schema)
+        benchmarks['export xlsx'] = lambda: exporting.export(p4_data, workspace.path('Line Detail.xlsx'))
+    
+    results = []
+    for name, function in benchmarks.items():
+        service = workspace.serve()
+        seconds = timed(function, repeat=repeat)
+        results.append({'benchmark': name, 'lines': workspace.lines, 'seconds': seconds,
+                        'lines_per_second': workspace.lines / seconds, 'calls': len(service.calls) // repeat})
+    
+    if workspace.files:
+        folder = os.getcwd()
+        os.chdir(workspace.folder)
+        try:
+            service = workspace.serve()
+            seconds = timed(lambda: (cold(), toolbelt.program_2()), repeat=1)
+        finally:
+            os.chdir(folder)
+        results.append({'benchmark': 'program_2', 'lines': workspace.lines, 'seconds': seconds,
+                        'lines_per_second': workspace.lines / seconds, 'calls': len(service.calls)})
+    
+    return results
+
+
+def bench_parallel(lines=1000000, workers=(1, 2, 4, 8, 16), repeat=1, seed=0, compact=True):
+    """Times classifying and totaling lines lines in memory with each number of workers.
+    
+        Worker processes are started before timing, as parallel keeps its pool between calls.
+    
+        Returns:
+            result(pandas.DataFrame): Seconds, speedup over one worker and speedup per worker.
+    """
+    
+    import parallel
+    
+    workspace = Workspace(lines, seed=seed, files=False)
+    carrier_status = workspace.carrier_status()
+    data = toolbelt.compact(workspace.open_orders, toolbelt.open_orders_schema) if compact else workspace.open_orders.fillna(0)
+    
+    def classify_and_total(count):
+        p4_data = parallel.classify(data.copy(deep=False), carrier_status, categorical=compact, workers=count)
+        return toolbelt.backlog_breakdown_totals(p4_data, workers=count)
+    
+    minimum = parallel.min_rows
+    parallel.min_rows = 0
+    results = []
+    try:
+        for count in workers:
+            if count > 1:
+                parallel.run(data.head(count), carrier_status, workers=count)
+            results.append({'workers': count, 'seconds': timed(classify_and_total, count, repeat=repeat)})
+    finally:
+        parallel.min_rows = minimum
+        parallel.shutdown()
+        shutil.rmtree(workspace.folder, ignore_errors=True)
+    
+    result = pd.DataFrame(results).set_index('workers')
+    result['speedup'] = result['seconds'].iloc[0] / result['seconds']
+    result['speedup_per_worker'] = result['speedup'] / result.index
+    return result
+
+
+def bench_import(module='toolbelt', repeat=3):
+    """Times importing module in a new interpreter with python -X importtime.
+    
+        Returns:
+            result(dict): 'seconds', the best cumulative import time, 'slowest', the ten modules
+                taking the most time themselves, and 'modules', every module imported.
+    """
+    
+    best = None
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], capture_output=True,
+                                 text=True, cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        
+        # Lines are 'import time: self [us] | cumulative | imported package'
+        times = []
+        for line in process.stderr.splitlines():
+            if line.startswith('import time:') and '[us]' not in line:
+                own, cumulative, name = line[len('import time:'):].split('|')
+                times.append((name.strip(), int(own), int(cumulative)))
+        
+        seconds = next(cumulative for name, _, cumulative in times if name == module) / 1e6
+        if best is None or seconds < best['seconds']:
+            slowest = sorted(times, key=lambda x: -x[1])[:10]
+            best = {
+                'seconds': seconds,
+                'slowest': [(name, own / 1e6) for name, own, _ in slowest],
+                'modules': [name for name, _, _ in times]
+            }
+    
+    return best
+
+
+def check_import(module='toolbelt', budget=None):
+    """Raises an Exception if importing module takes longer than budget, default import_budget,
+    or imports one of lazy_modules, and returns bench_import otherwise."""
+    
+    budget = import_budget if budget is None else budget
+    result = bench_import(module)
+    
+    eager = [x for x in result['modules'] if any(x == lazy or x.startswith(lazy + '.') for lazy in lazy_modules)]
+    if eager:
+        raise Exception('Importing {0} imports {1}'.format(module, eager))
+    if result['seconds'] > budget:
+        raise Exception('Importing {0} took {1:.3f}s, over the {2:.3f}s budget, slowest: {3}'.format(
+            module, result['seconds'], budget, result['slowest'][:5]))
+    
+    return result
+
+
+def run(lines=(10000, 100000), repeat=3, seed=0, latency=0.0, history_location=benchmark_history):
+    """Times every stage at each number of lines and appends the results to history_location.
+    
+        Returns:
+            result(pandas.DataFrame): Seconds of each benchmark by lines.
+    """
+    
+    results = []
+    for count in lines:
+        with Workspace(count, seed=seed, latency=latency) as workspace:
+            results.extend(bench_stages(workspace, repeat))
+    
+    if history_location:
+        record = {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'seed': seed,
+            'latency': latency,
+            'results': results
+        }
+        with open(history_location, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+    
+    return pd.DataFrame(results).pivot(index='benchmark', columns='lines', values='seconds')
+
+
+def _commit():
+    """Returns the current git commit of the repository, or None outside of git."""
+    
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def history(history_location=benchmark_history):
+    """Returns every result in history_location, one row per run, benchmark and lines."""
+    
+    rows = []
+    with open(history_location) as file:
+        for line in file:
+            record = json.loads(line)
+            for result in record['results']:
+                rows.append(dict(result, time=record['time'], commit=record['commit']))
+    return pd.DataFrame(rows)
+
+
+def compare(history_location=benchmark_history, runs=2):
+    """Compares the seconds of the last runs in history_location, ratio is last over first.
+    
+        A ratio above 1 is a regression, below 1 an improvement.
+    """
+    
+    results = history(history_location)
+    times = list(dict.fromkeys(results['time']))[-runs:]
+    results = results[results['time'].isin(times)]
+    labels = {x: '{0} {1}'.format(x, commit or '').strip() for x, commit in zip(results['time'], results['commit'])}
+    
+    table = results.pivot_table(index=['benchmark', 'lines'], columns='time', values='seconds')
+    table = table[times]
+    table['ratio'] = table[times[-1]] / table[times[0]]
+    return table.rename(columns=labels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Times the backlog report stages on generated reports.')
+    parser.add_argument('--lines', type=int, nargs='+', default=[10000, 100000], help='Open Orders lines of each run.')
+    parser.add_argument('--repeat', type=int, default=3, help='Calls of each stage, the best is kept.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds each sheets request waits.')
+    parser.add_argument('--history', default=benchmark_history, help='File results are appended to.')
+    parser.add_argument('--micro', action='store_true', help='Also time the carrier status join and sheet value conversions.')
+    parser.add_argument('--imports', action='store_true', help='Only check the import time of toolbelt against import_budget.')
+    parser.add_argument('--workers', type=int, nargs='*', help='Also time parallel classification with these numbers of workers.')
+    args = parser.parse_args()
+    
+    if args.imports:
+        result = check_import()
+        print('toolbelt imports in {0:.3f}s, budget {1:.3f}s'.format(result['seconds'], import_budget))
+        print(pd.DataFrame(result['slowest'], columns=['module', 'seconds']))
+        sys.exit(0)
+    
+    print(run(args.lines, args.repeat, latency=args.latency, history_location=args.history))
+    print(compare(args.history))
+    if args.workers:
+        print(bench_parallel(max(args.lines), args.workers))
+    if args.micro:
+        print(bench_carrier_status())
+        print(bench_values())
+        print(bench_process_1())
+        print(bench_get_ranges())
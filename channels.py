@@ -0,0 +1,165 @@
+"""Module to map customers to distribution channels with a table of rules instead of code."""
+
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import spreadsheets
+
+
+# Columns of a channel map table, see ChannelMap.from_values
+table_columns = ['BILL_TO_NAME', 'SALES_CHANNEL', 'CONTAINS', 'CHANNEL']
+
+
+class ChannelMap:
+    """Maps (BILL_TO_NAME, SALES_CHANNEL) pairs to a channel, first match wins:
+
+        1. pairs, exact (BILL_TO_NAME, SALES_CHANNEL) pairs.
+        2. names, exact BILL_TO_NAME.
+        3. contains, (substring, channel) rules in order, substring in BILL_TO_NAME.
+        4. sales_channels, exact SALES_CHANNEL.
+        5. default.
+
+        Each distinct pair of a call is mapped once, lines get the channel of their pair. Nothing
+        is kept between calls, so the rules can be changed at any time.
+
+        Args:
+            names(dict): BILL_TO_NAME to channel.
+            contains(list): (substring, channel) rules.
+            sales_channels(dict): SALES_CHANNEL to channel.
+            pairs(dict): (BILL_TO_NAME, SALES_CHANNEL) to channel.
+            default(str): Channel of pairs no rule matches.
+    """
+
+    def __init__(self, names=None, contains=(), sales_channels=None, pairs=None, default='Not Consumer'):
+        self.names = dict(names or {})
+        self.contains = [tuple(rule) for rule in contains]
+        self.sales_channels = dict(sales_channels or {})
+        self.pairs = dict(pairs or {})
+        self.default = default
+
+    def __repr__(self):
+        return 'ChannelMap({0} names, {1} contains rules, {2} sales channels, {3} pairs)'.format(
+            len(self.names), len(self.contains), len(self.sales_channels), len(self.pairs))
+
+    def channels(self):
+        """Returns every channel the map can give, sorted."""
+
+        result = set(self.names.values()) | set(self.sales_channels.values()) | set(self.pairs.values())
+        return sorted(result | {channel for _, channel in self.contains} | {self.default})
+
+    def channel(self, bill_to_name, sales_channel):
+        """Returns the channel of one pair."""
+
+        if (bill_to_name, sales_channel) in self.pairs:
+            return self.pairs[(bill_to_name, sales_channel)]
+        if bill_to_name in self.names:
+            return self.names[bill_to_name]
+        for substring, channel in self.contains:
+            if substring in str(bill_to_name):
+                return channel
+        return self.sales_channels.get(sales_channel, self.default)
+
+    def __call__(self, bill_to_names, sales_channels, categorical=False):
+        """Returns the channel of each line, mapping each distinct pair once.
+
+            Args:
+                bill_to_names(pandas.Series): BILL_TO_NAME of each line.
+                sales_channels(pandas.Series): SALES_CHANNEL of each line.
+                categorical(bool): Return a pandas.Categorical of channels(), else an array.
+        """
+
+        # Code each column, categories are coded once per category, missing values are code 0
+        name_codes, names = _factorize(bill_to_names)
+        channel_codes, channels_ = _factorize(sales_channels)
+        width = len(channels_) + 1
+
+        pair_codes = name_codes * width + channel_codes
+        unique, inverse = np.unique(pair_codes, return_inverse=True)
+
+        categories = self.channels()
+        position = {channel: i for i, channel in enumerate(categories)}
+        mapped = np.array([position[self.channel(_value(names, code // width), _value(channels_, code % width))]
+                           for code in unique.tolist()], dtype=np.int64)
+        codes = mapped[inverse.reshape(-1)] if len(unique) else np.zeros(0, dtype=np.int64)
+
+        if categorical:
+            return pd.Categorical.from_codes(codes, categories)
+        return np.asarray(categories, dtype=object)[codes]
+
+    @classmethod
+    def from_values(cls, values, default='Not Consumer'):
+        """Returns the ChannelMap of a values list with table_columns headers, e.g., from a sheet.
+
+            Each row is a rule by the columns it fills, besides CHANNEL: BILL_TO_NAME is a name,
+            BILL_TO_NAME and SALES_CHANNEL a pair, CONTAINS a contains rule, in row order, and
+            SALES_CHANNEL a sales channel.
+        """
+
+        headers = values[0]
+        missing = [column for column in table_columns if column not in headers]
+        if missing:
+            raise Exception('Channel map is missing columns: {0}'.format(missing))
+
+        result = cls(default=default)
+        for row in values[1:]:
+            rule = {column: (row[headers.index(column)] if headers.index(column) < len(row) else '') for column in table_columns}
+            rule = {column: str(value).strip() for column, value in rule.items()}
+            name, sales_channel, substring, channel = (rule[column] for column in table_columns)
+
+            if not channel:
+                continue
+            if substring:
+                result.contains.append((substring, channel))
+            elif name and sales_channel:
+                result.pairs[(name, sales_channel)] = channel
+            elif name:
+                result.names[name] = channel
+            elif sales_channel:
+                result.sales_channels[sales_channel] = channel
+
+        return result
+
+    @classmethod
+    def from_sheet(cls, spreadsheet_id, range_, default='Not Consumer'):
+        """Returns the ChannelMap of a sheet range, see from_values."""
+
+        return cls.from_values(spreadsheets.get(spreadsheet_id, range_).get('values', [table_columns]), default)
+
+    @classmethod
+    def from_file(cls, location, default='Not Consumer'):
+        """Returns the ChannelMap of a .csv or .xlsx file, see from_values."""
+
+        if location.lower().endswith('.csv'):
+            table = pd.read_csv(location, dtype=str, keep_default_na=False)
+        else:
+            table = pd.read_excel(location, dtype=str).fillna('')
+        return cls.from_values(spreadsheets.values(table), default)
+
+    def to_values(self):
+        """Returns the map as a values list, e.g., to start a channel map sheet or file."""
+
+        rows = [[name, sales_channel, '', channel] for (name, sales_channel), channel in self.pairs.items()]
+        rows += [[name, '', '', channel] for name, channel in self.names.items()]
+        rows += [['', '', substring, channel] for substring, channel in self.contains]
+        rows += [['', sales_channel, '', channel] for sales_channel, channel in self.sales_channels.items()]
+        return [list(table_columns)] + rows
+
+
+def _factorize(series):
+    """Returns codes from 1 and distinct values of series, missing values are code 0.
+
+        The categories of a categorical are used as they are, without looking at each line.
+    """
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), list(series.cat.categories)
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return codes.astype(np.int64) + 1, list(uniques)
+
+
+def _value(values, code):
+    """Returns the value of a _factorize code, None for missing values."""
+
+    return values[code - 1] if code else None
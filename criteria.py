@@ -0,0 +1,274 @@
+"""Module to define sifting criteria that compile to vectorized masks.
+
+Criteria are built from columns, e.g., (Col('ORG') == 'OK') & ~(Col('SALES_CHANNEL') == 'OTHER'),
+and evaluated with mask(data). Masks are memoized per DataFrame inside a memoized block, e.g., one
+report_dollars or classify call, and inside a single mask call, so they are never reused after
+data was changed.
+"""
+
+
+# Import Modules
+import contextlib
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+
+# Memoized masks of the memoized blocks running in each thread, id(DataFrame) -> {criteria: mask}
+_local = threading.local()
+
+# Observed fraction of rows each criteria keeps, used to order conjunctions
+_selectivity = {}
+
+
+def _caches():
+    if not hasattr(_local, 'caches'):
+        _local.caches = {}
+    return _local.caches
+
+
+@contextlib.contextmanager
+def memoized(data):
+    """Reuses the masks of data inside the with block, which must not change the columns it reads.
+
+        Blocks can be nested, the masks are forgotten when the outermost block of data ends.
+    """
+
+    caches = _caches()
+    key = id(data)
+    outermost = key not in caches
+    if outermost:
+        caches[key] = {}
+    try:
+        yield
+    finally:
+        if outermost:
+            caches.pop(key, None)
+
+
+def clear_masks(data=None):
+    """Forgets the masks of data memoized by the running memoized block, or of every DataFrame if None.
+
+        Needed inside a memoized block after columns it read were changed.
+    """
+
+    caches = _caches()
+    for key in (list(caches) if data is None else [id(data)]):
+        if key in caches:
+            caches[key] = {}
+
+
+def _evaluate(series, function):
+    """Applies a vectorized comparison to series, comparing categories once for categoricals."""
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = pd.Series(series.cat.categories, dtype=object)
+        missing = pd.Series([np.nan], dtype=object)
+        table = np.append(np.asarray(function(categories), dtype=bool), np.asarray(function(missing), dtype=bool))
+        return table[series.cat.codes.to_numpy()]
+
+    return np.asarray(function(series), dtype=bool)
+
+
+class Criteria:
+    """Base class of criteria, combine with &, | and ~."""
+
+    key = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.key == other.key
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.key))
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def mask(self, data):
+        """Returns a boolean numpy array of the rows of data that match the criteria."""
+
+        cache = _caches().get(id(data))
+        if cache is None:
+            with memoized(data):
+                return self.mask(data)
+
+        if self not in cache:
+            result = self.compute(data)
+            cache[self] = result
+            if len(result):
+                _selectivity[self] = result.mean()
+        return cache[self]
+
+    def compute(self, data):
+        raise NotImplementedError
+
+    def columns(self):
+        """Returns the set of columns the criteria reads."""
+
+        return {self.column}
+
+
+class Col:
+    """Column reference used to build criteria, e.g., Col('ORG') == 'OK'."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, value):
+        return Compare(self.name, '==', value)
+
+    def __ne__(self, value):
+        return Compare(self.name, '!=', value)
+
+    __hash__ = None
+
+    def isin(self, values):
+        return IsIn(self.name, values)
+
+    def contains(self, substring):
+        return Contains(self.name, substring)
+
+
+class Compare(Criteria):
+    """Column equal or not equal to a value."""
+
+    def __init__(self, column, operator, value):
+        self.column = column
+        self.operator = operator
+        self.value = value
+        self.key = (column, operator, value)
+
+    def __repr__(self):
+        return 'Col({0!r}) {1} {2!r}'.format(self.column, self.operator, self.value)
+
+    def compute(self, data):
+        if self.operator == '==':
+            return _evaluate(data[self.column], lambda series: series == self.value)
+        return _evaluate(data[self.column], lambda series: series != self.value)
+
+
+class IsIn(Criteria):
+    """Column value in a list of values."""
+
+    def __init__(self, column, values):
+        self.column = column
+        self.values = tuple(values)
+        self.key = (column, self.values)
+
+    def __repr__(self):
+        return 'Col({0!r}).isin({1!r})'.format(self.column, list(self.values))
+
+    def compute(self, data):
+        return _evaluate(data[self.column], lambda series: series.isin(self.values))
+
+
+class Contains(Criteria):
+    """Column value contains a substring, non-string values never match."""
+
+    def __init__(self, column, substring):
+        self.column = column
+        self.substring = substring
+        self.key = (column, substring)
+
+    def __repr__(self):
+        return 'Col({0!r}).contains({1!r})'.format(self.column, self.substring)
+
+    def compute(self, data):
+        return _evaluate(data[self.column], lambda series: series.astype(str).str.contains(self.substring, regex=False))
+
+
+class And(Criteria):
+    """All criteria match, evaluated most selective first and stopped once nothing matches."""
+
+    def __init__(self, *criteria):
+        self.criteria = tuple(c for x in criteria for c in (x.criteria if isinstance(x, And) else (x,)))
+        self.key = self.criteria
+
+    def __repr__(self):
+        return ' & '.join('({0!r})'.format(c) for c in self.criteria)
+
+    def columns(self):
+        return set().union(*(c.columns() for c in self.criteria))
+
+    def compute(self, data):
+        result = np.ones(len(data), dtype=bool)
+        for criteria in sorted(self.criteria, key=lambda c: _selectivity.get(c, 1.0)):
+            result = result & criteria.mask(data)
+            if not result.any():
+                break
+        return result
+
+
+class Or(Criteria):
+    """Any criteria match, stopped once everything matches."""
+
+    def __init__(self, *criteria):
+        self.criteria = tuple(c for x in criteria for c in (x.criteria if isinstance(x, Or) else (x,)))
+        self.key = self.criteria
+
+    def __repr__(self):
+        return ' | '.join('({0!r})'.format(c) for c in self.criteria)
+
+    def columns(self):
+        return set().union(*(c.columns() for c in self.criteria))
+
+    def compute(self, data):
+        result = np.zeros(len(data), dtype=bool)
+        for criteria in sorted(self.criteria, key=lambda c: -_selectivity.get(c, 0.0)):
+            result = result | criteria.mask(data)
+            if result.all():
+                break
+        return result
+
+
+class Not(Criteria):
+    """Criteria does not match."""
+
+    def __init__(self, criteria):
+        self.criteria = criteria
+        self.key = (criteria,)
+
+    def __repr__(self):
+        return '~({0!r})'.format(self.criteria)
+
+    def columns(self):
+        return self.criteria.columns()
+
+    def compute(self, data):
+        return ~self.criteria.mask(data)
+
+
+class Expression(Criteria):
+    """Legacy criteria given as a python expression of data, e.g., 'data["ORG"] == "OK"'."""
+
+    def __init__(self, source):
+        self.source = source
+        self.code = compile(source, '<criteria>', 'eval')
+        self.key = (source,)
+
+    def __repr__(self):
+        return 'Expression({0!r})'.format(self.source)
+
+    def columns(self):
+        return set(x[1] for x in re.findall(r'data\[([\'"])(.+?)\1\]', self.source))
+
+    def compute(self, data):
+        return np.asarray(eval(self.code, {}, {'data': data}), dtype=bool)
+
+
+def mask(data, *criteria):
+    """Returns the boolean mask of rows in data matching all criteria, strings are Expressions."""
+
+    criteria = [Expression(c) if isinstance(c, str) else c for c in criteria]
+    if not criteria:
+        return np.ones(len(data), dtype=bool)
+    if len(criteria) == 1:
+        return criteria[0].mask(data)
+    return And(*criteria).mask(data)
@@ -0,0 +1,152 @@
+"""Module to export report data to .xlsx, .csv or .parquet files, optionally in the background."""
+
+
+# Import Modules
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import instrument
+import spreadsheets
+
+
+logger = logging.getLogger(__name__)
+
+# Exports started by export_later and not yet waited for
+pending = []
+
+# Rows converted at a time by write_xlsx
+xlsx_block_rows = 10000
+
+_executor = None
+
+
+def write_xlsx(data, path, sheet_name):
+    """Writes data row by row with xlsxwriter in constant memory mode.
+
+        Rows are converted to cells xlsx_block_rows at a time, so memory stays bounded. Falls
+        back to DataFrame.to_excel when xlsxwriter is not installed.
+    """
+
+    try:
+        import xlsxwriter
+    except ImportError:
+        data.to_excel(path, sheet_name=sheet_name, index=False)
+        return
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+
+        dates = [pd.api.types.is_datetime64_any_dtype(dtype) for dtype in data.dtypes]
+        for i in [i for i, is_date in enumerate(dates) if is_date]:
+            worksheet.set_column(i, i, None, date_format)
+
+        # constant_memory needs rows written in order
+        worksheet.write_row(0, 0, [str(x) for x in data.columns])
+        for start in range(0, len(data), xlsx_block_rows):
+            block = data.iloc[start:start + xlsx_block_rows]
+
+            # Convert column by column, dates are kept as dates
+            columns = []
+            for i, is_date in enumerate(dates):
+                series = block.iloc[:, i]
+                if is_date:
+                    series = series.dt.tz_localize(None) if getattr(series.dtype, 'tz', None) else series
+                    columns.append([None if pd.isna(x) else x for x in series.dt.to_pydatetime()])
+                else:
+                    columns.append(spreadsheets.cells(series))
+
+            for row_number, row in enumerate(zip(*columns), start=start + 1):
+                worksheet.write_row(row_number, 0, row)
+    finally:
+        workbook.close()
+
+
+def export(data, path, file_format=None, sheet_name='Line Detail'):
+    """Writes data to path and returns the time and size it took.
+
+        Args:
+            data(pandas.DataFrame): Data to export, e.g., process_4 data.
+            path(str): File location.
+            file_format(str): 'xlsx', 'csv' or 'parquet', defaults to the extension of path.
+            sheet_name(str): Worksheet name for 'xlsx'.
+
+        Returns:
+            result(dict): path, format, rows, seconds and bytes of the export.
+    """
+
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    start = time.perf_counter()
+
+    with instrument.measure('export ' + file_format, rows=len(data)) as measurement:
+        if file_format == 'xlsx':
+            write_xlsx(data, path, sheet_name)
+        elif file_format == 'csv':
+            data.to_csv(path, index=False)
+        elif file_format == 'parquet':
+            # fillna(0) leaves columns of mixed str and int, which parquet rejects
+            mixed = data.select_dtypes(include='object').columns
+            data.astype({column: str for column in mixed}).to_parquet(path, index=False)
+        else:
+            raise Exception('No such format: \'{0}\''.format(file_format))
+        measurement.add(bytes_=os.path.getsize(path))
+
+    result = {
+        'path': path,
+        'format': file_format,
+        'rows': len(data),
+        'seconds': time.perf_counter() - start,
+        'bytes': os.path.getsize(path)
+    }
+    logger.info('Exported %d rows to %s in %.2fs (%.1f MB)', result['rows'], path, result['seconds'], result['bytes'] / 1e6)
+
+    return result
+
+
+def export_later(data, path, file_format=None, sheet_name='Line Detail'):
+    """Runs export in a background thread and returns its Future, see wait.
+
+        The export gets its own copy of data, so the caller can go on changing data. Errors are
+        logged when the export ends, and raised again by wait.
+    """
+
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(1, thread_name_prefix='export')
+
+    # With Copy-on-Write, changes to data copy the columns they change instead of writing to them,
+    # without it the export needs a copy of its own
+    future = _executor.submit(export, data.copy(deep=not _copy_on_write()), path, file_format, sheet_name)
+    future.add_done_callback(lambda done: _log_error(done, path))
+    pending.append(future)
+
+    return future
+
+
+def _copy_on_write():
+    """Returns True if pandas copies data shared by DataFrames when one changes it, always from pandas 3."""
+
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.options.mode.copy_on_write is True
+
+
+def _log_error(future, path):
+    """Logs the error of a finished export of path, if it failed."""
+
+    if not future.cancelled() and future.exception() is not None:
+        logger.error('Export to %s failed', path, exc_info=future.exception())
+
+
+def wait():
+    """Waits for every pending export and returns their export results, raising the first error."""
+
+    results = []
+    while pending:
+        results.append(pending.pop(0).result())
+
+    return results
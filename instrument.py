@@ -0,0 +1,341 @@
+"""Module to measure report stages: wall time, rows, bytes, API calls and peak memory.
+
+Stages are measured with measure, a context manager, or measured, a decorator, e.g.,
+
+    with instrument.measure('process_4') as measurement:
+        ...
+        measurement.add(rows=len(data))
+
+Measurements made inside another one in the same thread are nested in it, their API calls and
+bytes are added to it. report prints the measurements of the run as a table and saves them as JSON.
+"""
+
+
+# Import Modules
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+logger = logging.getLogger(__name__)
+
+# Set to False to stop recording measurements
+enabled = True
+
+# Peak memory of a measurement, 'rss' for how much it raised the peak resident size of the
+# process, 'tracemalloc' for the peak of python allocations while it ran, which slows
+# allocations, or None. The process peak resident size is recorded as well with 'rss'.
+memory = 'rss'
+
+# Names of measurements to profile, and the profiler, 'cProfile' or 'pyinstrument'
+profile = set()
+profiler = 'cProfile'
+profile_folder = 'profiles'
+
+# Finished measurements of this run, see reset
+records = []
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _max_rss():
+    """Returns the peak resident set size of the process in bytes, or None where unknown."""
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+class Measurement:
+    """A measured stage, see measure.
+
+        Args:
+            name(str): Name of the stage, e.g., 'read', 'process_4', 'spreadsheets.get'.
+            rows(int): Rows processed, can be added to with add.
+            bytes_(int): Bytes read, written or transferred, can be added to with add.
+            api_calls(int): Sheets API requests made, can be added to with add.
+    """
+
+    def __init__(self, name, rows=None, bytes_=0, api_calls=0):
+        self.name = name
+        self.rows = rows
+        self.bytes = bytes_
+        self.api_calls = api_calls
+        self.peak_memory = None
+        self.process_peak_memory = None
+        self._start_rss = None
+        self.parent = None
+        self.start = None
+        self.seconds = None
+        self._profiler = None
+
+    def __repr__(self):
+        return 'Measurement({0!r}, seconds={1!r}, rows={2!r})'.format(self.name, self.seconds, self.rows)
+
+    def add(self, rows=None, bytes_=0, api_calls=0):
+        """Adds rows, bytes and API calls to the measurement."""
+
+        if rows is not None:
+            self.rows = (self.rows or 0) + rows
+        self.bytes += bytes_
+        self.api_calls += api_calls
+
+    def __enter__(self):
+        if not enabled:
+            return self
+
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+
+        if memory == 'tracemalloc':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # The peak so far belongs to the measurement this one is nested in
+            if self.parent is not None:
+                self.parent._traced_peak()
+            tracemalloc.reset_peak()
+
+        if memory == 'rss':
+            self._start_rss = _max_rss()
+
+        if self.name in profile:
+            self._profiler = _start_profiler()
+
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.start is None:
+            return
+
+        self.seconds = time.perf_counter() - self.start
+        if self._profiler is not None:
+            _stop_profiler(self._profiler, self.name)
+
+        if memory == 'tracemalloc' and tracemalloc.is_tracing():
+            self._traced_peak()
+        elif memory == 'rss':
+            # The peak resident size only grows, so a stage below the peak so far raised it by 0
+            self.process_peak_memory = _max_rss()
+            if self.process_peak_memory is not None and self._start_rss is not None:
+                self.peak_memory = self.process_peak_memory - self._start_rss
+
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if self.parent is not None:
+            self.parent.add(bytes_=self.bytes, api_calls=self.api_calls)
+            if self.peak_memory is not None:
+                self.parent.peak_memory = max(self.parent.peak_memory or 0, self.peak_memory)
+
+        with _lock:
+            records.append(self.record(failed=exc_type is not None))
+
+    def _traced_peak(self):
+        self.peak_memory = max(self.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+
+    def record(self, failed=False):
+        """Returns the measurement as a dict for report."""
+
+        return {
+            'name': self.name,
+            'parent': self.parent.name if self.parent is not None else None,
+            'thread': threading.current_thread().name,
+            'process': os.getpid(),
+            'seconds': self.seconds,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'api_calls': self.api_calls,
+            'peak_memory': self.peak_memory,
+            'process_peak_memory': self.process_peak_memory,
+            'failed': failed
+        }
+
+
+def measure(name, rows=None, bytes_=0, api_calls=0):
+    """Returns a Measurement of name to use as a context manager."""
+
+    return Measurement(name, rows, bytes_, api_calls)
+
+
+def current():
+    """Returns the innermost measurement running in this thread, or None."""
+
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def add(rows=None, bytes_=0, api_calls=0):
+    """Adds rows, bytes and API calls to the current measurement, if there is one."""
+
+    measurement = current()
+    if measurement is not None:
+        measurement.add(rows, bytes_, api_calls)
+
+
+def record(name, seconds, rows=None, bytes_=0, api_calls=0):
+    """Records a measurement timed by the caller, nested in the current measurement.
+
+        Coroutines of one event loop share a thread, so their waits overlap and they cannot nest
+        measure blocks, e.g., async_spreadsheets times each request and records it here.
+    """
+
+    if not enabled:
+        return
+
+    measurement = Measurement(name, rows, bytes_, api_calls)
+    measurement.parent = current()
+    measurement.seconds = seconds
+    if measurement.parent is not None:
+        measurement.parent.add(bytes_=bytes_, api_calls=api_calls)
+
+    with _lock:
+        records.append(measurement.record())
+
+
+def measured(name=None):
+    """Decorator measuring each call of a function, named name or the function name.
+
+        The rows of a DataFrame or Series result are counted unless rows were added while it ran.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with measure(name or function.__name__) as measurement:
+                result = function(*args, **kwargs)
+                if measurement.rows is None and hasattr(result, 'shape') and hasattr(result, 'index'):
+                    measurement.rows = len(result)
+            return result
+        return wrapper
+
+    return decorator
+
+
+def _start_profiler():
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+        result = Profiler()
+        result.start()
+        return result
+
+    import cProfile
+    result = cProfile.Profile()
+    result.enable()
+    return result
+
+
+def _stop_profiler(running, name):
+    """Stops running and saves its profile of name to profile_folder, logging the hot paths."""
+
+    os.makedirs(profile_folder, exist_ok=True)
+    path = os.path.join(profile_folder, name.replace(os.sep, '_'))
+
+    if profiler == 'pyinstrument':
+        running.stop()
+        with open(path + '.html', 'w') as file:
+            file.write(running.output_html())
+        logger.info('Profile of %s:\n%s', name, running.output_text())
+        return
+
+    import io
+    import pstats
+    running.disable()
+    running.dump_stats(path + '.prof')
+    text = io.StringIO()
+    pstats.Stats(running, stream=text).sort_stats('cumulative').print_stats(20)
+    logger.info('Profile of %s:\n%s', name, text.getvalue())
+
+
+def reset():
+    """Forgets the measurements of the run."""
+
+    with _lock:
+        del records[:]
+
+
+def take():
+    """Returns the measurements of the run and forgets them."""
+
+    with _lock:
+        result = list(records)
+        del records[:]
+    return result
+
+
+def extend(more):
+    """Adds records made elsewhere, e.g., in a worker process."""
+
+    with _lock:
+        records.extend(more)
+
+
+def summary(run_records=None):
+    """Returns the records as a DataFrame, one row per name in order of first appearance.
+
+        seconds, rows, bytes and api_calls are summed over calls, peak_memory and
+        process_peak_memory are the largest.
+    """
+
+    import pandas as pd
+
+    run_records = records if run_records is None else run_records
+    columns = ['calls', 'seconds', 'rows', 'bytes', 'api_calls', 'peak_memory', 'process_peak_memory']
+    if not run_records:
+        return pd.DataFrame(columns=columns)
+
+    frame = pd.DataFrame(run_records)
+    if 'process_peak_memory' not in frame:
+        frame['process_peak_memory'] = None
+    grouped = frame.groupby('name', sort=False)
+    result = pd.DataFrame({
+        'calls': grouped.size(),
+        'seconds': grouped['seconds'].sum(),
+        'rows': grouped['rows'].sum(min_count=1),
+        'bytes': grouped['bytes'].sum(),
+        'api_calls': grouped['api_calls'].sum(),
+        'peak_memory': grouped['peak_memory'].max(),
+        'process_peak_memory': grouped['process_peak_memory'].max()
+    })
+    return result[columns]
+
+
+def report(path=None, run_records=None):
+    """Prints the summary of the run as a table and saves its records as JSON to path.
+
+        Returns:
+            result(pandas.DataFrame): The summary.
+    """
+
+    run_records = list(records if run_records is None else run_records)
+    result = summary(run_records)
+
+    table = result.copy()
+    table['seconds'] = table['seconds'].round(3)
+    table['MB'] = (table.pop('bytes') / 1e6).round(2)
+    # With memory 'rss' peak MB is how much a stage raised the process peak, not its own peak
+    table['peak MB'] = (table.pop('peak_memory').astype(float) / 1e6).round(1)
+    table['process peak MB'] = (table.pop('process_peak_memory').astype(float) / 1e6).round(1)
+    print(table.to_string())
+
+    if path is not None:
+        with open(path, 'w') as file:
+            json.dump({'records': run_records, 'summary': json.loads(result.to_json(orient='index'))}, file, indent=2)
+
+    return result
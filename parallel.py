@@ -0,0 +1,272 @@
+"""Module to classify and total large Open Orders extracts on several cores.
+
+The frame is written once to an Arrow IPC file, one record batch per partition of rows, which
+each worker process memory maps instead of receiving a pickled copy. Workers send back the
+derived columns as category codes and the DOLLARS totals as ExactSums, so the merged totals
+are the same whatever the number of workers.
+"""
+
+
+# Import Modules
+import fractions
+import logging
+import math
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import toolbelt
+
+
+logger = logging.getLogger(__name__)
+
+# Worker processes used when a function is not given workers, 1 runs everything in this process,
+# None one per core
+worker_processes = 1
+
+# Frames with fewer rows are classified in this process, as starting the work costs more
+min_rows = 200000
+
+# Columns added by toolbelt.classify
+derived_columns = ['DISTRIBUTION_CHANNEL_1', 'DISTRIBUTION_CHANNEL_2', 'CARRIER_STATUS', 'DISTRIBUTION_STATUS']
+
+# Columns toolbelt.classify reads
+classify_columns = ['ORG', 'SALES_CHANNEL', 'BILL_TO_NAME', 'ORDER_NUMBER', 'SHORTAGE_CATEGORY', 'LINE_STATUS']
+
+_pool = None
+_pool_size = None
+
+
+class ExactSum:
+    """Exact sum of float64 values, which can be added to other ExactSums in any order.
+
+        Each value is split into its binary exponent and 53 bit integer mantissa, and mantissas
+        are summed as integers per exponent, so no rounding happens until float is taken.
+    """
+
+    def __init__(self, values=()):
+        self.parts = {}
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+
+        mantissas, exponents = np.frexp(values)
+        mantissas = (mantissas * 2.0 ** 53).astype(np.int64)
+
+        # Halves of 27 bits can be summed in int64 for up to 2**36 values
+        high = mantissas >> 26
+        low = mantissas & ((1 << 26) - 1)
+        order = np.argsort(exponents, kind='stable')
+        exponents = exponents[order]
+        starts = np.flatnonzero(np.r_[True, exponents[1:] != exponents[:-1]])
+        high_sums = np.add.reduceat(high[order], starts)
+        low_sums = np.add.reduceat(low[order], starts)
+
+        for exponent, high_sum, low_sum in zip(exponents[starts].tolist(), high_sums.tolist(), low_sums.tolist()):
+            self.parts[exponent - 53] = (high_sum << 26) + low_sum
+
+    def __add__(self, other):
+        result = ExactSum()
+        result.parts = dict(self.parts)
+        for exponent, mantissa in other.parts.items():
+            result.parts[exponent] = result.parts.get(exponent, 0) + mantissa
+        return result
+
+    def __float__(self):
+        if not self.parts:
+            return 0.0
+        lowest = min(self.parts)
+        total = sum(mantissa << (exponent - lowest) for exponent, mantissa in self.parts.items())
+        if lowest >= 0:
+            return float(total << lowest)
+        return float(fractions.Fraction(total, 1 << -lowest))
+
+    def __repr__(self):
+        return 'ExactSum({0!r})'.format(float(self))
+
+
+def worker_count(rows, workers=None):
+    """Returns the worker processes to use for rows rows, 1 if they should not be split."""
+
+    count = worker_processes if workers is None else workers
+    count = count or os.cpu_count() or 1
+    if rows < min_rows:
+        return 1
+    return max(1, min(count, rows // max(1, min_rows // 4)))
+
+
+def pool(size):
+    """Returns the shared process pool of size workers, replacing a pool of another size."""
+
+    global _pool, _pool_size
+
+    if _pool is None or _pool_size != size:
+        shutdown()
+        # Forking a process running threads can deadlock, so workers are spawned, see stages
+        _pool = ProcessPoolExecutor(size, mp_context=multiprocessing.get_context('spawn'))
+        _pool_size = size
+
+    return _pool
+
+
+def shutdown():
+    """Stops the worker processes of the shared pool."""
+
+    global _pool, _pool_size
+
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+    _pool, _pool_size = None, None
+
+
+def _arrow_ready(data):
+    """Returns data with object columns Arrow cannot hold, e.g., str and int mixed by fillna(0), as str."""
+
+    converted = {}
+    for column in data.columns:
+        series = data[column]
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+            converted[column] = series.astype(str)
+    return data.assign(**converted) if converted else data
+
+
+def share(data, parts):
+    """Writes data to a temporary Arrow IPC file as parts record batches and returns its path."""
+
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(_arrow_ready(data), preserve_index=False)
+    file, path = tempfile.mkstemp(prefix='parallel_', suffix='.arrow')
+    os.close(file)
+
+    # Columns converted from pandas can be chunked, so each part is combined into a single batch
+    size = max(1, math.ceil(len(data) / parts))
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            for part in range(parts):
+                batches = table.slice(part * size, size).combine_chunks().to_batches()
+                writer.write_batch(batches[0] if batches else pa.RecordBatch.from_pylist([], schema=table.schema))
+
+    return path
+
+
+def _totals(data):
+    """Returns the Backlog Breakdown cells and pivots of a classified partition as ExactSums."""
+
+    cells = toolbelt.report_dollars(data, toolbelt.backlog_breakdown_cells, total=ExactSum)
+    selected = toolbelt.sift(data, toolbelt.ok_consumer, toolbelt.backlog)
+    dollars = selected['DOLLARS'].to_numpy()
+
+    pivots = {}
+    for name, column in (('channels', 'DISTRIBUTION_CHANNEL_2'), ('statuses', 'DISTRIBUTION_STATUS')):
+        keys = selected[column].astype(str).to_numpy()
+        pivots[name] = {key: ExactSum(dollars[keys == key]) for key in np.unique(keys).tolist()}
+
+    return dict(pivots, cells=cells)
+
+
+def _work(path, batch, carrier_status, classify, totals, mapping):
+    """Runs in a worker, classifies and totals record batch batch of the file at path.
+
+        mapping is the toolbelt.channel_map of the calling process, which the worker does not share.
+    """
+
+    import pyarrow as pa
+
+    data = pa.ipc.open_file(pa.memory_map(path)).get_batch(batch).to_pandas()
+    result = {}
+
+    if classify:
+        data = toolbelt.classify(data, carrier_status, categorical=True, mapping=mapping)
+        result['columns'] = {column: data[column].values for column in derived_columns}
+    if totals:
+        result['totals'] = _totals(data)
+
+    return result
+
+
+def _merge_totals(parts):
+    """Merges the _totals of every partition like toolbelt.backlog_breakdown_totals returns them."""
+
+    cells = {}
+    for range_, rows in parts[0]['cells'].items():
+        cells[range_] = [[float(sum((part['cells'][range_][i][0] for part in parts), ExactSum()))]
+                         for i in range(len(rows))]
+
+    result = {'cells': cells}
+    for name, column in (('channels', 'DISTRIBUTION_CHANNEL_2'), ('statuses', 'DISTRIBUTION_STATUS')):
+        merged = {}
+        for part in parts:
+            for key, total in part[name].items():
+                merged[key] = merged.get(key, ExactSum()) + total
+        keys = sorted(merged)
+        result[name] = pd.DataFrame({'DOLLARS': [float(merged[x]) for x in keys]}, index=pd.Index(keys, name=column))
+
+    return result
+
+
+def run(data, carrier_status=None, classify=True, totals=False, workers=None):
+    """Classifies and, or, totals data in worker processes, partitioned by row ranges.
+
+        Args:
+            data(pandas.DataFrame): Open_Orders_Extract data, or process_4 data to only total.
+            carrier_status(pandas.DataFrame): Carrier status table, needed to classify.
+            classify(bool): Return the derived columns.
+            totals(bool): Return the Backlog Breakdown totals.
+            workers(int): Worker processes, defaults to worker_processes.
+
+        Returns:
+            result(dict): 'columns', derived column name to pandas.Categorical, and, or, 'totals'
+                like toolbelt.backlog_breakdown_totals.
+    """
+
+    count = max(1, (worker_processes if workers is None else workers) or os.cpu_count() or 1)
+    needed = set(classify_columns) if classify else set(derived_columns)
+    if totals:
+        needed |= {'DOLLARS'} | set().union(*(c.columns() for rows in toolbelt.backlog_breakdown_cells.values()
+                                               for row in rows for c in row))
+    shared = data[[column for column in data.columns if column in needed]]
+
+    path = share(shared, count)
+    try:
+        futures = [pool(count).submit(_work, path, batch, carrier_status, classify, totals, toolbelt.channel_map) for batch in range(count)]
+        parts = [future.result() for future in futures]
+    finally:
+        os.remove(path)
+
+    result = {}
+    if classify:
+        result['columns'] = {column: pd.api.types.union_categoricals([part['columns'][column] for part in parts], sort_categories=True)
+                             for column in derived_columns}
+    if totals:
+        result['totals'] = _merge_totals([part['totals'] for part in parts])
+
+    return result
+
+
+def classify(data, carrier_status, categorical=False, workers=None):
+    """Like toolbelt.classify, in worker processes when data is large enough, see worker_count."""
+
+    count = worker_count(len(data), workers)
+    if count == 1:
+        return toolbelt.classify(data, carrier_status, categorical)
+
+    columns = run(data, carrier_status, workers=count)['columns']
+    for column in derived_columns:
+        values = columns[column]
+        data[column] = values if categorical else np.asarray(values, dtype=object)
+
+    return data
+
+
+def backlog_breakdown_totals(p4_data, workers=None):
+    """Like toolbelt.backlog_breakdown_totals, in worker processes when p4_data is large enough."""
+
+    count = worker_count(len(p4_data), workers)
+    if count == 1:
+        return toolbelt.backlog_breakdown_totals(p4_data, workers=1)
+
+    return run(p4_data, classify=False, totals=True, workers=count)['totals']
@@ -0,0 +1,174 @@
+"""Module to cache sheet-backed reference tables, e.g., the carrier_status table."""
+
+
+# Import Modules
+import logging
+import os
+import pickle
+import threading
+import time
+import spreadsheets
+
+
+logger = logging.getLogger(__name__)
+
+# Folder holding the on-disk copies of reference tables
+reference_cache = '.reference_cache'
+
+# Scope needed to read the Drive modifiedTime and version of a spreadsheet
+drive_scope = 'https://www.googleapis.com/auth/drive.metadata.readonly'
+
+
+def checksum_cell(spreadsheet_id, range_):
+    """Returns a revision function reading range_, e.g., a cell holding a checksum of the table.
+
+        Getting one cell is much cheaper than getting the table it stands for.
+    """
+
+    def revision():
+        return spreadsheets.get(spreadsheet_id, range_).get('values', [])
+
+    return revision
+
+
+def drive_revision(spreadsheet_id):
+    """Returns a revision function reading the Drive modifiedTime and version of spreadsheet_id.
+
+        Needs the Drive API enabled for the service account, drive_scope is requested on top of
+        spreadsheets.scopes. The revision is None while a stand-in service is used, it has no Drive.
+    """
+
+    local = threading.local()
+
+    def revision():
+        if spreadsheets.stand_in() is not None:
+            return None
+        if getattr(local, 'service', None) is None:
+            from googleapiclient.discovery import build
+            credentials = spreadsheets.credentials().with_scopes(spreadsheets.scopes + [drive_scope])
+            local.service = build('drive', 'v3', credentials=credentials, cache_discovery=False, static_discovery=True)
+        request = local.service.files().get(fileId=spreadsheet_id, fields='modifiedTime,version')
+        return request.execute(num_retries=spreadsheets.num_retries)
+
+    return revision
+
+
+class ReferenceTable:
+    """A table built from sheet values, kept for ttl seconds and downloaded again only if it changed.
+
+        get returns the kept table while it is younger than ttl. Once it is older, the revision of
+        the sheet is compared with the one the table was built from, and the table is only
+        fetched again if they differ, or if there is no revision function or it fails. The table is
+        also saved to reference_cache, so a new process starts from the saved copy.
+
+        counts has 'hits', tables returned without fetching, 'misses', fetches without a table
+        to return, 'refreshes', fetches replacing an older or changed table, and 'checks', of
+        the revision.
+
+        Tables are shared by every caller, so they should not be changed in place.
+
+        Args:
+            name(str): Name of the table, used for its file in reference_cache.
+            fetch(callable): Called without arguments, returns the table.
+            ttl(float): Seconds a table is returned without checking the sheet.
+            revision(callable): Called without arguments, returns a value that changes when the
+                sheet changes, or None where it is unknown, see checksum_cell and drive_revision.
+            saved(bool): Keep a copy in reference_cache.
+    """
+
+    def __init__(self, name, fetch, ttl=900, revision=None, saved=True):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.revision = revision
+        self.saved = saved
+        self.counts = {'hits': 0, 'misses': 0, 'refreshes': 0, 'checks': 0}
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'ReferenceTable({0!r}, ttl={1!r}, counts={2!r})'.format(self.name, self.ttl, self.counts)
+
+    @property
+    def location(self):
+        return os.path.join(reference_cache, '{0}.pkl'.format(self.name))
+
+    def _source(self):
+        """Returns what the table is read from, tables read from a stand-in service are not saved."""
+
+        return spreadsheets.stand_in()
+
+    def _load(self):
+        """Returns the saved entry, or None if there is none to use."""
+
+        if not self.saved or self._source() is not None or not os.path.exists(self.location):
+            return None
+        try:
+            with open(self.location, 'rb') as file:
+                return pickle.load(file)
+        except Exception as error:
+            logger.warning('Could not load %s: %s', self.location, error)
+            return None
+
+    def _save(self, entry):
+        if not self.saved or self._source() is not None:
+            return
+        os.makedirs(reference_cache, exist_ok=True)
+        with open(self.location + '.tmp', 'wb') as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.location + '.tmp', self.location)
+
+    def _revision(self):
+        """Returns the revision of the sheet, or None if there is no revision function or it failed."""
+
+        if self.revision is None:
+            return None
+        try:
+            return self.revision()
+        except Exception as error:
+            logger.warning('Could not check the revision of %s, fetching it: %s', self.name, error)
+            return None
+
+    def get(self, refresh=False):
+        """Returns the table, fetching it only if it is missing, changed or refresh is True."""
+
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry['source'] is not self._source():
+                entry = self._load()
+
+            revision, checked = None, False
+            if entry is not None and not refresh:
+                if time.time() - entry['time'] < self.ttl:
+                    self._entry = entry
+                    self.counts['hits'] += 1
+                    return entry['table']
+
+                if self.revision is not None:
+                    self.counts['checks'] += 1
+                    revision, checked = self._revision(), True
+                    if revision is not None and revision == entry['revision']:
+                        entry['time'] = time.time()
+                        self._entry = entry
+                        self._save(entry)
+                        self.counts['hits'] += 1
+                        return entry['table']
+
+            # The revision is read before the table, so a change in between is fetched next time
+            if not checked:
+                revision = self._revision()
+            self.counts['misses' if entry is None else 'refreshes'] += 1
+            entry = {'table': self.fetch(), 'time': time.time(), 'revision': revision, 'source': self._source()}
+            logger.info('Fetched %s, %d rows', self.name, len(entry['table']))
+
+            self._entry = entry
+            self._save(entry)
+            return entry['table']
+
+    def clear(self):
+        """Forgets the kept table and its saved copy."""
+
+        with self._lock:
+            self._entry = None
+            if os.path.exists(self.location):
+                os.remove(self.location)
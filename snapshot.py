@@ -0,0 +1,238 @@
+"""Module to refresh the backlog from what changed in the Open Orders extract since the last run."""
+
+
+# Import Modules
+import hashlib
+import json
+import logging
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import exporting
+import streaming
+import toolbelt
+
+
+logger = logging.getLogger(__name__)
+
+# File holding the Snapshot of the last run
+snapshot_location = 'Open_Orders_Snapshot.pkl'
+
+# Lines are matched between runs on these columns, plus LINE for repeated items on an order
+key_columns = ['ORDER_NUMBER', 'ITEM_NO']
+
+
+def keyed(data):
+    """Returns data indexed by ORDER, ITEM and LINE, the count of the item on the order so far."""
+
+    line = data.groupby(key_columns, observed=True, sort=False).cumcount()
+    data = data.copy(deep=False)
+    data.index = pd.MultiIndex.from_arrays([data[x] for x in key_columns] + [line], names=['ORDER', 'ITEM', 'LINE'])
+    return data
+
+
+def fingerprint():
+    """Returns a hash of what stored classifications and totals depend on, the Backlog Breakdown
+        cells and the channel map, so a Snapshot made with others is not reused."""
+
+    spec = {
+        'cells': {range_: [[repr(c) for c in row] for row in rows] for range_, rows in toolbelt.backlog_breakdown_cells.items()},
+        'channels': [toolbelt.channel_map.to_values(), toolbelt.channel_map.default]
+    }
+    return hashlib.sha1(json.dumps(spec, default=str).encode()).hexdigest()
+
+
+def aggregators():
+    """Returns new aggregators of the Backlog Breakdown cells and pivots."""
+
+    return {
+        'cells': streaming.CellSums(toolbelt.backlog_breakdown_cells),
+        'channels': streaming.PivotSum('DISTRIBUTION_CHANNEL_2', [toolbelt.ok_consumer, toolbelt.backlog]),
+        'statuses': streaming.PivotSum('DISTRIBUTION_STATUS', [toolbelt.ok_consumer, toolbelt.backlog])
+    }
+
+
+class Snapshot:
+    """Classified Open Orders lines of a run, with their Backlog Breakdown totals.
+
+        Args:
+            data(pandas.DataFrame): Classified lines, indexed by keyed.
+            totals(dict): Aggregators from aggregators, holding the totals of data.
+            moves(pandas.DataFrame): Lines inserted, deleted or changed since the run before.
+            updates(dict): Backlog Breakdown range to values list written by the run.
+            fingerprint(str): fingerprint of the run, defaults to the current one.
+            hashes(numpy.ndarray): row_hashes of data, compared with the next run.
+            hashed(list): Columns hashes were made of.
+    """
+
+    def __init__(self, data, totals, moves=None, updates=None, fingerprint_=None, hashes=None, hashed=None):
+        self.data = data
+        self.totals = totals
+        self.moves = moves
+        self.updates = updates
+        self.fingerprint = fingerprint_ or fingerprint()
+        self.hashes = hashes
+        self.hashed = hashed
+
+    @classmethod
+    def load(cls, location=snapshot_location):
+        """Returns the Snapshot saved at location, or None if there is none."""
+
+        if not os.path.exists(location):
+            return None
+        with open(location, 'rb') as file:
+            return pickle.load(file)
+
+    def save(self, location=snapshot_location):
+        """Saves the Snapshot to location, replacing the file only once it is fully written."""
+
+        with open(location + '.tmp', 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(location + '.tmp', location)
+
+    def results(self):
+        """Returns the totals like toolbelt.backlog_breakdown_totals."""
+
+        return {name: aggregator.result() for name, aggregator in self.totals.items()}
+
+    def moved(self, column='DISTRIBUTION_CHANNEL_2'):
+        """Summarizes what moved since the run before, DOLLARS change by column and type of move."""
+
+        if self.moves is None or self.moves.empty:
+            return pd.DataFrame(columns=['DOLLARS_CHANGE'])
+        return pd.pivot_table(self.moves, values='DOLLARS_CHANGE', index=column, columns='MOVE', aggfunc='sum', fill_value=0)
+
+
+def compared_columns(data):
+    """Returns the columns lines are compared on between runs, Open Orders columns and carrier status."""
+
+    return [column for column in toolbelt.open_orders_columns + ['CARRIER_STATUS']
+            if column in data.columns and column not in key_columns]
+
+
+def row_hashes(data, columns):
+    """Returns a hash of the columns of each line, lines hash the same if their values are the same.
+
+        Text columns are factorized and only their distinct values are hashed, which is much
+        faster than pandas.util.hash_pandas_object for the text columns of Open Orders.
+    """
+
+    result = np.full(len(data), 0x345678, dtype=np.uint64)
+    for column in columns:
+        series = data[column]
+        if series.dtype.kind in 'biufcmM':
+            hashes = pd.util.hash_array(series.to_numpy())
+        else:
+            codes, uniques = pd.factorize(series)
+            # Missing values are code -1, the last hash
+            hashes = np.append(pd.util.hash_array(np.asarray(uniques, dtype=object)), np.uint64(0))[codes]
+        result = (result ^ hashes) * np.uint64(1000003)
+    return result
+
+
+def refresh(data, carrier_status, previous=None):
+    """Classifies data and updates the totals of previous with the lines that changed.
+
+        Lines are matched on their key and compared on a hash of their Open Orders columns and
+        carrier status, only inserted and changed lines are classified, and the totals are changed
+        by the DOLLARS of inserted, deleted and changed lines instead of being summed again.
+
+        Args:
+            data(pandas.DataFrame): Open Orders report data, from toolbelt.read.
+            carrier_status(pandas.DataFrame): Carrier status table from toolbelt.get_carrier_status.
+            previous(Snapshot): Snapshot of the last run, everything is inserted if None, or if
+                it was made with other Backlog Breakdown cells or channel map, see fingerprint.
+
+        Returns:
+            result(Snapshot): Snapshot of this run, its moves are the changes since previous.
+    """
+
+    new = keyed(toolbelt.attach_carrier_status(data.copy(deep=False), carrier_status))
+    if not new.index.is_unique:
+        raise Exception('Open Orders lines are not unique on {0}'.format(key_columns))
+
+    if previous is not None and getattr(previous, 'fingerprint', None) != fingerprint():
+        logger.info('Backlog Breakdown cells or channel map changed since the snapshot, refreshing every line')
+        previous = None
+
+    columns = compared_columns(new)
+    hashes = row_hashes(new, columns)
+    if previous is None:
+        old = new.iloc[:0]
+        old_hashes = hashes[:0]
+        totals = aggregators()
+    else:
+        old = previous.data
+        totals = previous.totals
+        # Snapshots saved before hashes were kept, or compared on other columns, are hashed again
+        if getattr(previous, 'hashed', None) == columns and len(previous.hashes) == len(old):
+            old_hashes = previous.hashes
+        else:
+            old_hashes = row_hashes(old, columns)
+
+    # Split lines into inserted, deleted, changed and unchanged by position
+    positions = old.index.get_indexer(new.index)
+    found = positions >= 0
+    same = np.zeros(len(new), dtype=bool)
+    same[found] = hashes[found] == old_hashes[positions[found]]
+    inserted = ~found
+    changed = found & ~same
+    deleted = np.ones(len(old), dtype=bool)
+    deleted[positions[found]] = False
+
+    # Only classify lines that are new or changed
+    fresh = toolbelt.classify(new.iloc[np.flatnonzero(~same)].copy(), carrier_status)
+    gone = old.iloc[np.concatenate([np.flatnonzero(deleted), positions[changed]])]
+    for aggregator in totals.values():
+        if len(fresh):
+            aggregator.add(fresh, 1)
+        if len(gone):
+            aggregator.add(gone, -1)
+
+    # Unchanged lines keep their derived columns, which are put back in the order of data
+    if same.any():
+        order = np.argsort(np.concatenate([np.flatnonzero(same), np.flatnonzero(~same)]), kind='stable')
+        classified = new.copy(deep=False)
+        for column in fresh.columns.difference(new.columns, sort=False):
+            values = pd.concat([old[column].iloc[positions[same]], fresh[column]]).iloc[order]
+            classified[column] = values.set_axis(new.index)
+    else:
+        classified = fresh
+
+    # Record what moved, fresh lines are in the order of data
+    fresh_inserted = inserted[~same]
+    fresh_changed = changed[~same]
+    old_changed = old.iloc[positions[changed]]
+    moves = pd.concat([
+        fresh[fresh_inserted].assign(MOVE='Inserted', DOLLARS_CHANGE=fresh.loc[fresh_inserted, 'DOLLARS']),
+        old[deleted].assign(MOVE='Deleted', DOLLARS_CHANGE=-old.loc[deleted, 'DOLLARS']),
+        fresh[fresh_changed].assign(MOVE='Changed', DOLLARS_CHANGE=fresh.loc[fresh_changed, 'DOLLARS'].to_numpy()
+                                    - old_changed['DOLLARS'].to_numpy())
+    ])
+
+    return Snapshot(classified, totals, moves, hashes=hashes, hashed=columns)
+
+
+def program_2(report_location='Open_Orders_Extract.xlsx', location=snapshot_location, formats=('xlsx',)):
+    """Runs process 2 and an incremental process 4, writing only the Backlog Breakdown ranges that changed.
+
+        Returns:
+            result(Snapshot): Snapshot of this run, see Snapshot.moved.
+    """
+
+    dropships = toolbelt.process_2()
+    data = toolbelt.read('Open_Orders_Extract', report_location, usecols=toolbelt.open_orders_columns)
+    previous = Snapshot.load(location)
+
+    result = refresh(data, toolbelt.get_carrier_status(), previous)
+    line_detail = result.data.reset_index(drop=True)[toolbelt.line_detail_columns]
+    for file_format in formats:
+        exporting.export_later(line_detail, 'Line Detail.' + file_format)
+
+    result.updates = toolbelt.update_backlog_breakdown(dropships, totals=result.results(),
+                                                       previous=previous.updates if previous else None)
+    result.save(location)
+    exporting.wait()
+
+    return result
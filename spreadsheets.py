@@ -1,22 +1,100 @@
 """Module for interacting with google sheets."""
 
 
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import Future
+import time
+import numpy as np
 import pandas as pd
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from IPython.display import display
+import instrument
+
+
+# Service account key file and scopes used by service
+keys = 'keys.json'
+scopes = ['https://www.googleapis.com/auth/spreadsheets']
+
+# Retries, with exponential backoff, of requests answered with 429 or 5xx
+num_retries = 5
+
+# Updates with the same values as the last update of their range are skipped, see written
+skip_unchanged = True
+write_cache = '.sheets_cache.json'
+write_counts = {'written': 0, 'skipped': 0, 'invalidated': 0}
+
+_lock = threading.Lock()
+_local = threading.local()
+_credentials = None
+_stand_in = None
+_written = None
+
+
+def credentials():
+    """Returns the service account credentials, loaded once and shared by every thread."""
+    
+    global _credentials
+    
+    with _lock:
+        if _credentials is None:
+            from google.oauth2 import service_account
+            _credentials = service_account.Credentials.from_service_account_file(keys, scopes=scopes)
+    
+    return _credentials
 
 
 def service():
-    """Returns a service object to access google sheets."""
+    """Returns a service object to access google sheets.
+    
+        The service is built once per thread, since its http connection is not thread safe, from
+        the shared credentials so the access token is reused until it expires. The discovery
+        document bundled with googleapiclient is used, so no discovery request is made.
+        googleapiclient is only imported here, so runs without sheets requests never load it.
+    """
     
-    scopes = ['https://www.googleapis.com/auth/spreadsheets']
-    keys = 'keys.json'
-    creds = None
-    creds = service_account.Credentials.from_service_account_file(keys, scopes=scopes)
-    service = build('sheets', 'v4', credentials=creds)
+    if _stand_in is not None:
+        return _stand_in
     
-    return service
+    if getattr(_local, 'service', None) is None:
+        from googleapiclient.discovery import build
+        _local.service = build('sheets', 'v4', credentials=credentials(), cache_discovery=False, static_discovery=True)
+    
+    return _local.service
+
+
+def use_service(service_=None):
+    """Makes service return service_, e.g., a LocalService, or the google service again if None.
+    
+        The written cache is started over, and kept in memory only while a stand-in is used.
+    """
+    
+    global _stand_in, _written
+    with _lock:
+        _stand_in = service_
+        _written = None
+
+
+def execute(request, name, body=None):
+    """Executes request with num_retries, measured as one API call named 'spreadsheets.' + name.
+    
+        The bytes of body and of the response are counted as transferred, see instrument.
+    """
+    
+    with instrument.measure('spreadsheets.' + name, api_calls=1) as measurement:
+        response = request.execute(num_retries=num_retries)
+        if instrument.enabled:
+            sent = len(json.dumps(body, default=str)) if body is not None else 0
+            measurement.add(bytes_=sent + len(json.dumps(response, default=str)))
+    
+    return response
+
+
+def stand_in():
+    """Returns the service set by use_service, None while the google service is used."""
+    
+    return _stand_in
 
 
 def clear(spreadsheet_id, range_):
@@ -32,12 +110,20 @@ def clear(spreadsheet_id, range_):
     request = service().spreadsheets().values().clear(**params)
     
     # Execute request and assign response
-    response = request.execute()
+    response = execute(request, 'clear')
+    _record_clears([(spreadsheet_id, range_)])
     return response
 
 
 def update(spreadsheet_id, range_, values, value_input_option='USER_ENTERED'):
-    """Executes Google Sheets update request and returns the response."""
+    """Executes Google Sheets update request and returns the response.
+    
+        The request is skipped, and a response with 'skipped' returned, when values are the same
+        as the last values written to range_, see written.
+    """
+    
+    if unchanged(spreadsheet_id, range_, values, value_input_option):
+        return _skipped(spreadsheet_id, range_)
     
     # Assign body param
     body = {
@@ -56,7 +142,8 @@ def update(spreadsheet_id, range_, values, value_input_option='USER_ENTERED'):
     request = service().spreadsheets().values().update(**params)
     
     # Execute request and return response
-    response = request.execute()
+    response = execute(request, 'update', body)
+    _record_writes([(spreadsheet_id, range_, values, value_input_option)])
     return response
 
 
@@ -73,44 +160,651 @@ def get(spreadsheet_id, range_):
     request = service().spreadsheets().values().get(**params)
     
     # Execute request and return response
-    response = request.execute()
+    response = execute(request, 'get')
+    _record_reads([(spreadsheet_id, range_, response)])
     return response
 
 
-def values(df, index=False):
-    """Converts Pandas DataFrame to values list."""
+def written():
+    """Returns the write cache, spreadsheet ID to range to the hashes of what was last written.
+    
+        Each entry has 'hash', of the values and value input option of the last update of the
+        range, 'extent', the cells it filled, and 'seen', get range to the hash of the cells of
+        the entry the first get of that range after the update returned. Any get overlapping
+        the entry counts, e.g., a get of 'B3:B47' checks an entry of 'Current!B6:B10'. A later
+        get of the range returning other cells means they were edited elsewhere, so the entry
+        is dropped and the next update is sent. Edits made elsewhere are only noticed through gets.
+        
+        The cache is loaded from write_cache, and saved there, unless a stand-in service is used.
+    """
+    
+    global _written
+    
+    with _lock:
+        if _written is None:
+            _written = {}
+            if _stand_in is None and os.path.exists(write_cache):
+                try:
+                    with open(write_cache) as file:
+                        _written = json.load(file)
+                except ValueError:
+                    _written = {}
+    
+    return _written
+
+
+def forget(spreadsheet_id=None, range_=None):
+    """Drops write cache entries of range_, of spreadsheet_id, or every entry if both are None."""
+    
+    cache = written()
+    with _lock:
+        if spreadsheet_id is None:
+            cache.clear()
+        elif range_ is None:
+            cache.pop(spreadsheet_id, None)
+        else:
+            cache.get(spreadsheet_id, {}).pop(range_, None)
+    _save_written()
+
+
+def _hash(values, value_input_option=None):
+    """Returns a hash of values, a values list, and value_input_option."""
+    
+    text = json.dumps([value_input_option, values], default=str, separators=(',', ':'))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _overlaps(range_, other):
+    """Returns True if the A1 ranges range_ and other can share cells."""
+    
+    sheet, top, left, bottom, right = range_
+    other_sheet, other_top, other_left, other_bottom, other_right = other
+    
+    # A range without a sheet is on the first sheet, which could be any sheet
+    if sheet is not None and other_sheet is not None and sheet != other_sheet:
+        return False
+    return (top <= (other_bottom or top) and other_top <= (bottom or other_top) and
+            left <= (other_right or left) and other_left <= (right or other_left))
+
+
+def _extent(range_, values=None):
+    """Returns the _a1 split of range_, limited to the cells values fill when it is given."""
+    
+    sheet, top, left, bottom, right = _a1(range_)
+    if values is not None:
+        bottom = top + max(len(values), 1) - 1
+        right = left + max([len(row) for row in values] + [1]) - 1
+    return (sheet, top, left, bottom, right)
+
+
+def _drop_overlapping(cache, spreadsheet_id, extent, keep=None):
+    """Drops entries of spreadsheet_id overlapping extent, except keep, and returns how many."""
+    
+    ranges = cache.get(spreadsheet_id, {})
+    dropped = [x for x, entry in ranges.items() if x != keep and _overlaps(extent, tuple(entry['extent']))]
+    for range_ in dropped:
+        del ranges[range_]
+    return len(dropped)
+
+
+def _save_written():
+    """Saves the write cache to write_cache, replacing the file only once it is fully written."""
+    
+    if _stand_in is not None or _written is None:
+        return
+    
+    with _lock:
+        text = json.dumps(_written)
+    with open(write_cache + '.tmp', 'w') as file:
+        file.write(text)
+    os.replace(write_cache + '.tmp', write_cache)
+
+
+def _skipped(spreadsheet_id, range_):
+    """Returns the response of an update skipped by unchanged."""
+    
+    return {'spreadsheetId': spreadsheet_id, 'updatedRange': range_, 'updatedCells': 0, 'skipped': True}
+
+
+def unchanged(spreadsheet_id, range_, values, value_input_option='USER_ENTERED'):
+    """Returns True if an update of range_ with values can be skipped, counting it in write_counts."""
+    
+    if not skip_unchanged:
+        return False
+    
+    entry = written().get(spreadsheet_id, {}).get(range_)
+    with _lock:
+        if entry is not None and entry['hash'] == _hash(values, value_input_option):
+            write_counts['skipped'] += 1
+            return True
+    
+    return False
+
+
+def _changed(clears, updates):
+    """Returns a bool per update, (spreadsheet ID, range, values, value input option), False if it can be skipped.
+    
+        Clears, (spreadsheet ID, range), are sent first and updates in order, so the write cache
+        entries a clear, or an earlier update, overlaps are dropped before an update is checked.
+    """
+    
+    cache = written()
+    with _lock:
+        for spreadsheet_id, range_ in clears:
+            _drop_overlapping(cache, spreadsheet_id, _extent(range_))
+    
+    result = []
+    for spreadsheet_id, range_, values, value_input_option in updates:
+        result.append(not unchanged(spreadsheet_id, range_, values, value_input_option))
+        if result[-1]:
+            with _lock:
+                _drop_overlapping(cache, spreadsheet_id, _extent(range_, values))
+    
+    _save_written()
+    return result
+
+
+def _record_writes(updates):
+    """Records updates, (spreadsheet ID, range, values, value input option), in the write cache.
+    
+        Entries of other ranges the values overlap are dropped, as their cells may have changed.
+    """
+    
+    cache = written()
+    with _lock:
+        for spreadsheet_id, range_, values, value_input_option in updates:
+            extent = _extent(range_, values)
+            _drop_overlapping(cache, spreadsheet_id, extent, keep=range_)
+            cache.setdefault(spreadsheet_id, {})[range_] = {
+                'hash': _hash(values, value_input_option),
+                'seen': {},
+                'extent': list(extent)
+            }
+            write_counts['written'] += 1
+    _save_written()
+
+
+def _record_clears(clears):
+    """Drops write cache entries overlapping clears, (spreadsheet ID, range)."""
+    
+    cache = written()
+    with _lock:
+        for spreadsheet_id, range_ in clears:
+            _drop_overlapping(cache, spreadsheet_id, _extent(range_))
+    _save_written()
+
+
+def _covered(values, read, extent):
+    """Returns the cells of extent in values, got for the extent read, without trailing blanks."""
+    
+    _, read_top, read_left, read_bottom, read_right = read
+    _, top, left, bottom, right = extent
+    top, left = max(top, read_top), max(left, read_left)
+    bottom, right = min(bottom, read_bottom or bottom), min(right, read_right or right)
+    
+    rows = []
+    for row in values[top - read_top:bottom - read_top + 1]:
+        cells = list(row[left - read_left:right - read_left + 1])
+        while cells and cells[-1] == '':
+            cells.pop()
+        rows.append(cells)
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def _record_reads(responses):
+    """Checks gets, (spreadsheet ID, range, response), against the write cache.
+    
+        The cells of each entry a get overlaps are recorded the first time that range is read
+        after the entry was written, and the entry is dropped if they changed since, see written.
+    """
+    
+    cache = written()
+    changed = False
+    with _lock:
+        for spreadsheet_id, range_, response in responses:
+            ranges = cache.get(spreadsheet_id, {})
+            read = _extent(range_)
+            for written_range, entry in list(ranges.items()):
+                extent = tuple(entry['extent'])
+                if not _overlaps(read, extent):
+                    continue
+                # Entries saved before reads were compared by cells hold a single hash
+                if not isinstance(entry.get('seen'), dict):
+                    entry['seen'] = {}
+                seen = _hash(_covered(response.get('values', []), read, extent))
+                if range_ not in entry['seen']:
+                    entry['seen'][range_] = seen
+                elif entry['seen'][range_] != seen:
+                    del ranges[written_range]
+                    write_counts['invalidated'] += 1
+                changed = True
+    if changed:
+        _save_written()
+
+
+class SheetBatch:
+    """Collects update, clear and get requests and sends them as values batch requests.
+    
+        Requests are sent by flush, or when leaving a with block, as one batchClear, one
+        batchUpdate per value input option and one batchGet per spreadsheet, split when a
+        request would exceed max_bytes or max_ranges. Clears are sent before updates, and gets
+        after both. update, clear and get return a Future of the response for their range.
+        Updates of unchanged values are skipped at flush, see unchanged.
     
-    # Assign empty list
-    values = []
+        Args:
+            max_bytes(int): Largest estimated body size of one request.
+            max_ranges(int): Most ranges in one request.
+    """
     
-    # If index is wanted in values list, put the index into the body and make it the first column
-    if index:    
-        df[df.index.name] = df.index
-        index_col = df.pop(df.index.name)
-        df.insert(0, df.index.name, index_col)
+    def __init__(self, max_bytes=2000000, max_ranges=100):
+        self.max_bytes = max_bytes
+        self.max_ranges = max_ranges
+        self.clears = []
+        self.updates = []
+        self.gets = []
     
-    # Append column headers to values
-    values.append(list(df.columns))
+    def __enter__(self):
+        return self
     
-    # Append each row of dataframe values to values
-    for row in df.values.tolist():
-        values.append(row)
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+    
+    def __len__(self):
+        return len(self.clears) + len(self.updates) + len(self.gets)
+    
+    def clear(self, spreadsheet_id, range_):
+        """Queues a clear request."""
+        
+        future = Future()
+        self.clears.append((spreadsheet_id, range_, future))
+        return future
+    
+    def update(self, spreadsheet_id, range_, values, value_input_option='USER_ENTERED'):
+        """Queues an update request, flush skips it if values are unchanged."""
+        
+        future = Future()
+        self.updates.append((spreadsheet_id, value_input_option, {'range': range_, 'values': values}, future))
+        return future
+    
+    def get(self, spreadsheet_id, range_):
+        """Queues a get request."""
+        
+        future = Future()
+        self.gets.append((spreadsheet_id, range_, future))
+        return future
+    
+    def chunks(self, items):
+        """Splits items of (item, estimated bytes) into lists within max_ranges and max_bytes."""
+        
+        chunk, total = [], 0
+        for item, nbytes in items:
+            if chunk and (len(chunk) >= self.max_ranges or total + nbytes > self.max_bytes):
+                yield chunk
+                chunk, total = [], 0
+            chunk.append(item)
+            total += nbytes
+        if chunk:
+            yield chunk
+    
+    def _unchanged(self, clears, updates):
+        """Answers updates that can be skipped and returns the others, see _changed."""
+        
+        changed = _changed([(spreadsheet_id, range_) for spreadsheet_id, range_, _ in clears],
+                           [(spreadsheet_id, data['range'], data['values'], value_input_option)
+                            for spreadsheet_id, value_input_option, data, _ in updates])
         
-    return values
+        sent = []
+        for update, send in zip(updates, changed):
+            spreadsheet_id, _, data, future = update
+            if send:
+                sent.append(update)
+            else:
+                future.set_result(_skipped(spreadsheet_id, data['range']))
+        
+        return sent
+    
+    def flush(self):
+        """Sends every queued request and returns the batch responses."""
+        
+        clears, updates, gets = self.clears, self.updates, self.gets
+        self.clears, self.updates, self.gets = [], [], []
+        responses = []
+        
+        try:
+            updates = self._unchanged(clears, updates)
+            
+            for spreadsheet_id in dict.fromkeys(x[0] for x in clears):
+                queued = [((x[1], x[2]), len(x[1])) for x in clears if x[0] == spreadsheet_id]
+                for chunk in self.chunks(queued):
+                    body = {'ranges': [range_ for range_, _ in chunk]}
+                    request = service().spreadsheets().values().batchClear(spreadsheetId=spreadsheet_id, body=body)
+                    response = execute(request, 'batchClear', body)
+                    for (range_, future), cleared_range in zip(chunk, response.get('clearedRanges', [])):
+                        future.set_result({'spreadsheetId': spreadsheet_id, 'clearedRange': cleared_range})
+                    _record_clears([(spreadsheet_id, range_) for range_, _ in chunk])
+                    responses.append(response)
+            
+            for spreadsheet_id, value_input_option in dict.fromkeys((x[0], x[1]) for x in updates):
+                queued = [((x[2], x[3]), len(json.dumps(x[2], default=str))) for x in updates if x[:2] == (spreadsheet_id, value_input_option)]
+                for chunk in self.chunks(queued):
+                    body = {'valueInputOption': value_input_option, 'data': [data for data, _ in chunk]}
+                    request = service().spreadsheets().values().batchUpdate(spreadsheetId=spreadsheet_id, body=body)
+                    response = execute(request, 'batchUpdate', body)
+                    for (_, future), updated in zip(chunk, response.get('responses', [])):
+                        future.set_result(updated)
+                    _record_writes([(spreadsheet_id, data['range'], data['values'], value_input_option) for data, _ in chunk])
+                    responses.append(response)
+            
+            for spreadsheet_id in dict.fromkeys(x[0] for x in gets):
+                queued = [((x[1], x[2]), len(x[1])) for x in gets if x[0] == spreadsheet_id]
+                for chunk in self.chunks(queued):
+                    ranges = [range_ for range_, _ in chunk]
+                    request = service().spreadsheets().values().batchGet(spreadsheetId=spreadsheet_id, ranges=ranges)
+                    response = execute(request, 'batchGet')
+                    for (_, future), value_range in zip(chunk, response.get('valueRanges', [])):
+                        future.set_result(value_range)
+                    _record_reads([(spreadsheet_id, range_, value_range) for range_, value_range in zip(ranges, response.get('valueRanges', []))])
+                    responses.append(response)
+        
+        # Requests that were not answered fail with the error
+        except Exception as error:
+            for queued in (clears, updates, gets):
+                for x in queued:
+                    if not x[-1].done():
+                        x[-1].set_exception(error)
+            raise
+        
+        return responses
+
+
+def cells(series):
+    """Converts a Pandas Series to a list of cell values.
+    
+        Numbers and booleans stay numbers and booleans, datetimes become 'YYYY-MM-DD' strings, with
+        the time when there is one, and missing values become ''.
+    """
+    
+    dtype = series.dtype
+    
+    # Convert each category once
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = cells(pd.Series(series.cat.categories)) + ['']
+        return [categories[code] for code in series.cat.codes.tolist()]
+    
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        dates = series.dt.tz_localize(None) if getattr(dtype, 'tz', None) else series
+        has_time = bool((dates.dropna() != dates.dropna().dt.normalize()).any())
+        text = dates.dt.strftime('%Y-%m-%d %H:%M:%S' if has_time else '%Y-%m-%d')
+        return text.where(dates.notna(), '').tolist()
+    
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biu':
+        return series.to_numpy().tolist()
+    
+    if isinstance(dtype, np.dtype) and dtype.kind == 'f':
+        array = series.to_numpy()
+        missing = np.isnan(array)
+        result = array.tolist()
+        if missing.any():
+            for i in np.flatnonzero(missing).tolist():
+                result[i] = ''
+        return result
+    
+    result = series.to_numpy(dtype=object)
+    missing = pd.isna(result)
+    if missing.any():
+        result = result.copy()
+        result[missing] = ''
+    return result.tolist()
+
+
+def values(df, index=False):
+    """Converts Pandas DataFrame to values list, column by column and without changing df."""
+    
+    # Assign headers and columns
+    headers = list(df.columns)
+    columns = [cells(df.iloc[:, i]) for i in range(df.shape[1])]
+    
+    # If index is wanted in values list, make it the first column
+    if index:
+        headers = list(df.index.names) + headers
+        levels = [cells(df.index.get_level_values(i).to_series()) for i in range(df.index.nlevels)]
+        columns = levels + columns
+    
+    # Append column headers and rows to values
+    return [headers] + [list(row) for row in zip(*columns)]
+
+
+def downcast(numbers):
+    """Converts a numeric Series to the smallest int or float dtype that keeps every value exactly."""
+    
+    if numbers.notna().all() and bool((numbers == np.floor(numbers)).all()):
+        return pd.to_numeric(numbers, downcast='integer')
+    
+    single = numbers.astype('float32')
+    if bool((single.astype('float64') == numbers)[numbers.notna()].all()):
+        return single
+    return numbers.astype('float64')
+
+
+def infer(series, category_ratio=0.5):
+    """Converts a column of sheet values to the smallest fitting dtype.
+    
+        Columns of numbers are downcast, see downcast, other columns with few distinct values
+        become categories. '' is treated as missing.
+    
+        Args:
+            series(pandas.Series): Column of sheet values.
+            category_ratio(float): Largest ratio of distinct to total values for a category.
+    """
+    
+    present = series.notna() & (series.astype(object) != '')
+    if not present.any():
+        return series
+    
+    # Only parse the whole column when its first value is a number
+    try:
+        float(series[present].iloc[0])
+        numbers = pd.to_numeric(series.where(present), errors='coerce')
+    except (TypeError, ValueError):
+        numbers = None
+    
+    if numbers is not None and numbers.notna().sum() == present.sum():
+        return downcast(numbers)
+    
+    if series.nunique() <= category_ratio * len(series):
+        return series.astype('category')
+    
+    return series
 
 
-def df(values, index=None):
-    """Converts values list to Pandas DataFrame"""
+def df(values, index=None, dtypes=True):
+    """Converts values list to Pandas DataFrame
+    
+        Rows shorter than the headers, as the sheets api returns rows without their trailing
+        empty cells, are filled with ''. Column dtypes are inferred with infer if dtypes is True.
+    """
     
     # Assign headers and body
     headers = values[0]
-    body = values[1:]
+    width = len(headers)
+    body = [row[:width] + [''] * (width - len(row)) for row in values[1:]]
     
     # Assign DataFrame
-    df = pd.DataFrame(body, columns=headers)
+    df = pd.DataFrame(body, columns=headers, dtype=object)
+    if dtypes:
+        df = pd.DataFrame({i: infer(df.iloc[:, i]) for i in range(width)})
+        df.columns = headers
     
     # If index is passed, set index
     if index != None:
         df.set_index(index, inplace=True)
     
-    return df
\ No newline at end of file
+    return df
+
+
+# Used to run the sheets functions offline
+class LocalService:
+    """In-memory stand-in for the google sheets service returned by service.
+    
+        Supports the spreadsheets().values() get, update, clear, batchGet, batchUpdate and
+        batchClear requests. Every executed request is appended to calls.
+    
+        Args:
+            sheets(dict): Spreadsheet ID to {sheet name: values list} to start with.
+            latency(float): Seconds each request waits before executing, to mimic round-trips.
+    """
+    
+    def __init__(self, sheets=None, latency=0.0):
+        self.data = {}
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+        for spreadsheet_id, tabs in (sheets or {}).items():
+            for sheet, rows in tabs.items():
+                self._write(spreadsheet_id, "'{0}'!A1".format(sheet), rows)
+    
+    def spreadsheets(self):
+        return self
+    
+    def values(self):
+        return self
+    
+    def get(self, spreadsheetId, range, **kwargs):
+        return _LocalRequest(self, 'get', lambda: self._read(spreadsheetId, range))
+    
+    def update(self, spreadsheetId, range, body, valueInputOption=None, **kwargs):
+        return _LocalRequest(self, 'update', lambda: self._write(spreadsheetId, range, body.get('values', [])))
+    
+    def clear(self, spreadsheetId, range, body=None, **kwargs):
+        return _LocalRequest(self, 'clear', lambda: self._clear(spreadsheetId, range))
+    
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        def execute():
+            return {
+                'spreadsheetId': spreadsheetId,
+                'valueRanges': [self._read(spreadsheetId, range_) for range_ in ranges]
+            }
+        return _LocalRequest(self, 'batchGet', execute)
+    
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        def execute():
+            responses = [self._write(spreadsheetId, x['range'], x.get('values', [])) for x in body.get('data', [])]
+            return {
+                'spreadsheetId': spreadsheetId,
+                'totalUpdatedCells': sum(x['updatedCells'] for x in responses),
+                'responses': responses
+            }
+        return _LocalRequest(self, 'batchUpdate', execute)
+    
+    def batchClear(self, spreadsheetId, body, **kwargs):
+        def execute():
+            cleared = [self._clear(spreadsheetId, range_)['clearedRange'] for range_ in body.get('ranges', [])]
+            return {'spreadsheetId': spreadsheetId, 'clearedRanges': cleared}
+        return _LocalRequest(self, 'batchClear', execute)
+    
+    def _sheet(self, spreadsheet_id, sheet):
+        tabs = self.data.setdefault(spreadsheet_id, {})
+        if sheet is None:
+            sheet = next(iter(tabs), 'Sheet1')
+        return sheet, tabs.setdefault(sheet, {})
+    
+    def _read(self, spreadsheet_id, range_):
+        sheet, cells = self._sheet(spreadsheet_id, _a1(range_)[0])
+        _, top, left, bottom, right = _a1(range_)
+        bottom = bottom or max([row for row, _ in cells] + [0])
+        right = right or max([column for _, column in cells] + [0])
+        
+        values = []
+        for row in range(top, bottom + 1):
+            line = [cells.get((row, column), '') for column in range(left, right + 1)]
+            while line and line[-1] == '':
+                line.pop()
+            values.append(line)
+        while values and not values[-1]:
+            values.pop()
+        
+        result = {'range': range_, 'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+    
+    def _write(self, spreadsheet_id, range_, values):
+        sheet, cells = self._sheet(spreadsheet_id, _a1(range_)[0])
+        _, top, left, _, _ = _a1(range_)
+        
+        for i, line in enumerate(values):
+            for j, value in enumerate(line):
+                cells[(top + i, left + j)] = '' if value is None else str(value)
+        
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'updatedRange': range_,
+            'updatedRows': len(values),
+            'updatedColumns': max([len(line) for line in values] + [0]),
+            'updatedCells': sum(len(line) for line in values)
+        }
+    
+    def _clear(self, spreadsheet_id, range_):
+        sheet, cells = self._sheet(spreadsheet_id, _a1(range_)[0])
+        _, top, left, bottom, right = _a1(range_)
+        
+        for row, column in list(cells):
+            if top <= row <= (bottom or row) and left <= column <= (right or column):
+                del cells[(row, column)]
+        
+        return {'spreadsheetId': spreadsheet_id, 'clearedRange': range_}
+
+
+class _LocalRequest:
+    """Request returned by LocalService, executed like a googleapiclient HttpRequest."""
+    
+    def __init__(self, service_, method, function):
+        self.service = service_
+        self.method = method
+        self.function = function
+    
+    def execute(self, num_retries=0, **kwargs):
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        with self.service._lock:
+            self.service.calls.append(self.method)
+            return self.function()
+
+
+def _column(letters):
+    """Converts column letters to a column number, e.g., 'A' -> 1, 'AA' -> 27."""
+    
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def _a1(range_):
+    """Splits an A1 range into (sheet, top, left, bottom, right), open ends are None.
+    
+        e.g., 'Current!B6:B10' -> ('Current', 6, 2, 10, 2), 'Carrier Push' -> ('Carrier Push', 1, 1, None, None).
+    """
+    
+    sheet, _, cells = range_.rpartition('!')
+    match = re.fullmatch(r'([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?', cells.upper())
+    
+    # A range without cells is a whole sheet
+    if not sheet and (match is None or not re.search(r'\d|:', cells)):
+        return (range_.strip("'"), 1, 1, None, None)
+    
+    start_column, start_row, end_column, end_row = match.groups()
+    top = int(start_row) if start_row else 1
+    left = _column(start_column) if start_column else 1
+    
+    if end_column is None and end_row is None:
+        bottom = top if start_row else None
+        right = left if start_column else None
+    else:
+        bottom = int(end_row) if end_row else None
+        right = _column(end_column) if end_column else (left if end_row else None)
+    
+    return (sheet.strip("'") or None, top, left, bottom, right)
@@ -0,0 +1,115 @@
+"""Module to run report stages concurrently, each as soon as its inputs are ready."""
+
+
+# Import Modules
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import instrument
+
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """A step of a report run.
+
+        Args:
+            name(str): Name other stages use to depend on this stage.
+            function(callable): Called with the results of inputs, in order.
+            inputs(list): Names of the stages this stage needs.
+            pool(str): 'thread' for I/O like sheets requests, 'process' for CPU bound work like
+                parsing Excel files. Process stages need a picklable function, e.g., a
+                functools.partial of a module level function.
+    """
+
+    def __init__(self, name, function, inputs=(), pool='thread'):
+        if pool not in ('thread', 'process'):
+            raise Exception('No such pool: \'{0}\''.format(pool))
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.pool = pool
+
+    def __repr__(self):
+        return 'Stage({0!r}, inputs={1!r}, pool={2!r})'.format(self.name, self.inputs, self.pool)
+
+
+def _timed(name, parent, function, *args):
+    """Returns the result of function(*args), its wall time in seconds and its measurements.
+
+        The call is measured as 'stage ' + name. Measurements are only returned when made in a
+        worker process, those made in the process with pid parent are already recorded.
+    """
+
+    start = time.perf_counter()
+    with instrument.measure('stage ' + name):
+        result = function(*args)
+    seconds = time.perf_counter() - start
+
+    return result, seconds, instrument.take() if os.getpid() != parent else []
+
+
+def run(stages, threads=None, processes=None):
+    """Runs stages concurrently in dependency order.
+
+        Args:
+            stages(list): Stage objects, inputs must name other stages in the list.
+            threads(int): Thread pool size, defaults to one per thread stage.
+            processes(int): Process pool size, defaults to one per process stage.
+
+        Returns:
+            results(dict): Stage name to result.
+            timings(dict): Stage name to wall time in seconds.
+    """
+
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in by_name]
+        if missing:
+            raise Exception('Stage \'{0}\' has unknown inputs: {1}'.format(stage.name, missing))
+
+    thread_count = threads or max(1, sum(stage.pool == 'thread' for stage in stages))
+    process_count = processes or sum(stage.pool == 'process' for stage in stages)
+
+    results = {}
+    timings = {}
+    pending = {}
+    waiting = list(stages)
+
+    pools = {'thread': ThreadPoolExecutor(thread_count)}
+    if process_count:
+        # Forking while other stages run threads can deadlock, so workers are spawned
+        pools['process'] = ProcessPoolExecutor(process_count, mp_context=multiprocessing.get_context('spawn'))
+
+    try:
+        while waiting or pending:
+
+            # Submit every stage whose inputs are ready
+            for stage in [x for x in waiting if all(name in results for name in x.inputs)]:
+                waiting.remove(stage)
+                args = [results[name] for name in stage.inputs]
+                pending[pools[stage.pool].submit(_timed, stage.name, os.getpid(), stage.function, *args)] = stage
+
+            if not pending:
+                raise Exception('Stages have circular inputs: {0}'.format([x.name for x in waiting]))
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = pending.pop(future)
+                results[stage.name], timings[stage.name], measurements = future.result()
+                instrument.extend(measurements)
+                logger.info('%s finished in %.2fs', stage.name, timings[stage.name])
+
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+    return results, timings
@@ -0,0 +1,165 @@
+"""Module to process Open Orders extracts in row chunks, so memory stays bounded by the chunk size."""
+
+
+# Import Modules
+import csv
+import pandas as pd
+import toolbelt
+
+
+def iter_chunks(report_location, chunksize=50000, usecols=None, schema=None):
+    """Yields the Open_Orders_Extract ReportOutput rows as DataFrames of chunksize rows.
+
+        .xlsx files are streamed with openpyxl in read only mode, .csv exports with pandas.
+        Each chunk is filled like read does, or compacted with schema.
+
+        Args:
+            report_location(str): File location, .xlsx or .csv.
+            chunksize(int): Rows per chunk.
+            usecols(list): Only keep these columns, e.g., toolbelt.open_orders_columns.
+            schema(dict): Column types to compact each chunk with, see toolbelt.compact.
+    """
+
+    def prepare(chunk):
+        if usecols is not None:
+            chunk = chunk[[column for column in chunk.columns if column in set(usecols)]]
+        return toolbelt.compact(chunk, schema) if schema else chunk.fillna(0)
+
+    if report_location.lower().endswith('.csv'):
+        for chunk in pd.read_csv(report_location, skiprows=1, chunksize=chunksize):
+            yield prepare(chunk)
+        return
+
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(report_location, read_only=True, data_only=True)
+    try:
+        rows = workbook['ReportOutput'].iter_rows(values_only=True)
+        next(rows)
+        headers = list(next(rows))
+        keep = [i for i, header in enumerate(headers) if usecols is None or header in usecols]
+
+        buffer = []
+        for row in rows:
+            buffer.append([row[i] if i < len(row) else None for i in keep])
+            if len(buffer) == chunksize:
+                yield prepare(pd.DataFrame(buffer, columns=[headers[i] for i in keep]))
+                buffer = []
+        if buffer:
+            yield prepare(pd.DataFrame(buffer, columns=[headers[i] for i in keep]))
+    finally:
+        workbook.close()
+
+
+class CellSums:
+    """Adds up report_dollars of each chunk for a report spec like toolbelt.backlog_breakdown_cells."""
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.totals = {range_: [[0.0] for _ in rows] for range_, rows in cells.items()}
+
+    def add(self, chunk, sign=1):
+        """Adds the cells of chunk, or subtracts them if sign is -1."""
+
+        for range_, rows in toolbelt.report_dollars(chunk, self.cells).items():
+            for total, row in zip(self.totals[range_], rows):
+                total[0] += sign * row[0]
+
+    def result(self):
+        return {range_: [list(row) for row in rows] for range_, rows in self.totals.items()}
+
+
+class PivotSum:
+    """Adds up a DOLLARS pivot of each chunk, like pandas.pivot_table(..., aggfunc=sum).
+
+        Args:
+            index(str or list): Column or columns to group by.
+            criteria(list): Criteria rows must match, see toolbelt.sift.
+            values(str): Column to sum.
+    """
+
+    def __init__(self, index, criteria=(), values='DOLLARS'):
+        self.index = index
+        self.criteria = criteria
+        self.values = values
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, chunk, sign=1):
+        """Adds the rows of chunk, or subtracts them if sign is -1."""
+
+        select_data = toolbelt.sift(chunk, *self.criteria)
+        grouped = select_data.groupby(self.index, observed=True, sort=False)[self.values].agg(['sum', 'count'])
+        for key, total, count in zip(grouped.index, grouped['sum'], grouped['count']):
+            self.totals[key] = self.totals.get(key, 0) + sign * total
+            self.counts[key] = self.counts.get(key, 0) + sign * count
+
+            # Groups without rows are left out, like pivot_table does
+            if self.counts[key] <= 0:
+                del self.totals[key], self.counts[key]
+
+    def result(self):
+        names = self.index if isinstance(self.index, list) else [self.index]
+        if len(names) > 1:
+            index = pd.MultiIndex.from_tuples(list(self.totals), names=names)
+        else:
+            index = pd.Index(list(self.totals), name=names[0])
+        return pd.DataFrame({self.values: list(self.totals.values())}, index=index).sort_index()
+
+
+def stream(report_location='Open_Orders_Extract.xlsx', carrier_status=None, output='Line Detail.csv',
+           chunksize=50000, compact=True):
+    """Classifies the Open Orders report chunk by chunk, writing Line Detail rows as it goes.
+
+        Args:
+            report_location(str): File location, .xlsx or .csv.
+            carrier_status(pandas.DataFrame): Carrier status table, fetched if None.
+            output(str): Line Detail .csv file, or None to skip writing it.
+            chunksize(int): Rows per chunk.
+            compact(bool): Compact chunks with toolbelt.open_orders_schema.
+
+        Returns:
+            result(dict): 'cells', 'channels' and 'statuses' like toolbelt.backlog_breakdown_totals,
+                and 'late_trucks' like toolbelt.process_3.
+    """
+
+    if carrier_status is None:
+        carrier_status = toolbelt.get_carrier_status()
+    schema = toolbelt.open_orders_schema if compact else None
+
+    cells = CellSums(toolbelt.backlog_breakdown_cells)
+    channels = PivotSum('DISTRIBUTION_CHANNEL_2', [toolbelt.ok_consumer, toolbelt.backlog])
+    statuses = PivotSum('DISTRIBUTION_STATUS', [toolbelt.ok_consumer, toolbelt.backlog])
+    late_trucks = PivotSum(toolbelt.late_truck_index, [toolbelt.late_truck])
+
+    file = open(output, 'w', newline='') if output else None
+    try:
+        if file:
+            csv.writer(file).writerow(toolbelt.line_detail_columns)
+
+        for chunk in iter_chunks(report_location, chunksize, toolbelt.open_orders_columns, schema):
+            chunk = toolbelt.classify(chunk, carrier_status, categorical=compact)
+            for aggregator in (cells, channels, statuses, late_trucks):
+                aggregator.add(chunk)
+            if file:
+                chunk[toolbelt.line_detail_columns].to_csv(file, header=False, index=False)
+    finally:
+        if file:
+            file.close()
+
+    return {
+        'cells': cells.result(),
+        'channels': channels.result(),
+        'statuses': statuses.result(),
+        'late_trucks': late_trucks.result().sort_values('DOLLARS', ascending=False)
+    }
+
+
+def program_2(report_location='Open_Orders_Extract.xlsx', chunksize=50000):
+    """Runs process 2 and the streaming process 4 and updates Backlog Breakdown Google Sheet."""
+
+    dropships = toolbelt.process_2()
+    totals = stream(report_location, chunksize=chunksize)
+    toolbelt.update_backlog_breakdown(dropships, totals=totals)
+
+    return totals
@@ -0,0 +1,9 @@
+"""Puts the repository modules on sys.path for the tests."""
+
+
+# Import Modules
+import os
+import sys
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,131 @@
+"""Fake Sheets REST API server for the async_spreadsheets tests."""
+
+
+# Import Modules
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import spreadsheets
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalServer:
+    """Serves a spreadsheets.LocalService over the Sheets REST API on localhost, in a thread.
+
+        Point a Client at url. Requests beyond rate_limit per second are answered with 429 and
+        a Retry-After of retry_after seconds, like the Sheets API quota.
+
+        Args:
+            service_(spreadsheets.LocalService): Sheets to serve, defaults to an empty one.
+            rate_limit(int): Requests allowed per second, None for no limit.
+            retry_after(str): Retry-After header of 429 responses.
+    """
+
+    def __init__(self, service_=None, rate_limit=None, retry_after='1'):
+        self.service = service_ if service_ is not None else spreadsheets.LocalService()
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.statuses = []
+        self._window = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}/v4/spreadsheets'.format(host, port)
+
+    def start(self):
+        """Starts serving on a free port."""
+
+        local = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+            def _answer(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                status, headers, response = local.handle(self.command, self.path, body)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_PUT = do_POST = _answer
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """Stops serving."""
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _limited(self):
+        if self.rate_limit is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._window = [x for x in self._window if now - x < 1.0]
+            if len(self._window) >= self.rate_limit:
+                return True
+            self._window.append(now)
+            return False
+
+    def handle(self, method, path, body):
+        """Returns the status, headers and JSON response of a request to the served sheets."""
+
+        if self._limited():
+            self.statuses.append(429)
+            return 429, {'Retry-After': self.retry_after}, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}}
+
+        parts = urlsplit(path)
+        params = parse_qs(parts.query)
+        _, _, rest = parts.path.partition('/spreadsheets/')
+        spreadsheet_id, _, rest = rest.partition('/')
+        spreadsheet_id = unquote(spreadsheet_id)
+        values = self.service.spreadsheets().values()
+
+        if rest == 'values:batchGet':
+            request = values.batchGet(spreadsheetId=spreadsheet_id, ranges=params.get('ranges', []))
+        elif rest == 'values:batchUpdate':
+            request = values.batchUpdate(spreadsheetId=spreadsheet_id, body=body)
+        elif rest == 'values:batchClear':
+            request = values.batchClear(spreadsheetId=spreadsheet_id, body=body)
+        elif rest.startswith('values/') and rest.endswith(':clear'):
+            request = values.clear(spreadsheetId=spreadsheet_id, range=unquote(rest[len('values/'):-len(':clear')]))
+        elif rest.startswith('values/') and method == 'PUT':
+            request = values.update(spreadsheetId=spreadsheet_id, range=unquote(rest[len('values/'):]), body=body,
+                                    valueInputOption=params.get('valueInputOption', [None])[0])
+        elif rest.startswith('values/'):
+            request = values.get(spreadsheetId=spreadsheet_id, range=unquote(rest[len('values/'):]))
+        else:
+            self.statuses.append(404)
+            return 404, {}, {'error': {'code': 404, 'message': 'No such request: {0} {1}'.format(method, path)}}
+
+        self.statuses.append(200)
+        return 200, {}, request.execute()
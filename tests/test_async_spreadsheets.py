@@ -0,0 +1,101 @@
+"""Tests of async_spreadsheets against a fake Sheets server."""
+
+
+# Import Modules
+import asyncio
+import time
+import pytest
+import async_spreadsheets
+import spreadsheets
+from sheets_server import LocalServer
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(spreadsheets, 'write_cache', str(tmp_path / 'sheets_cache.json'))
+    monkeypatch.setattr(spreadsheets, '_written', None)
+    spreadsheets.use_service(None)
+
+
+@pytest.fixture
+def server(cache):
+    with LocalServer(spreadsheets.LocalService({'S': {'Current': [['', x] for x in range(1, 11)]}})) as server_:
+        yield server_
+
+
+def run(url, requests):
+    """Runs requests, a function of a Client returning a coroutine, with a Client of url."""
+
+    async def main():
+        async with async_spreadsheets.Client(url, max_concurrency=4, token='token') as client:
+            return await requests(client)
+
+    return asyncio.run(main())
+
+
+def test_get_update_and_batches(server):
+    gets = run(server.url, lambda client: asyncio.gather(*(client.get('S', 'Current!B{0}'.format(x)) for x in range(1, 6))))
+    assert [x['values'] for x in gets] == [[[str(x)]] for x in range(1, 6)]
+
+    async def writes(client):
+        await client.update('S', 'Current!C1:C2', [[1], [2]])
+        await client.batch_update('S', [{'range': 'Current!D1', 'values': [['x']]}])
+        await client.batch_clear('S', ['Current!B1'])
+        return await client.batch_get('S', ['Current!C1:C2', 'Current!D1', 'Current!B1'])
+
+    value_ranges = run(server.url, writes)['valueRanges']
+    assert [x.get('values') for x in value_ranges] == [[['1'], ['2']], [['x']], None]
+
+
+def test_unchanged_writes_are_skipped(server):
+    async def writes(client):
+        first = await client.update('S', 'Current!C1', [[1]])
+        second = await client.update('S', 'Current!C1', [[1]])
+        batch = await client.batch_update('S', [{'range': 'Current!C1', 'values': [[1]]},
+                                                {'range': 'Current!D1', 'values': [[2]]}])
+        return first, second, batch
+
+    first, second, batch = run(server.url, writes)
+    assert not first.get('skipped') and second.get('skipped')
+    assert [x.get('skipped', False) for x in batch['responses']] == [True, False]
+    assert server.service.calls == ['update', 'batchUpdate']
+
+
+def test_update_after_overlapping_update_in_the_batch_is_sent(server):
+    async def writes(client):
+        await client.update('S', 'Current!A1:A2', [[1], [2]])
+        batch = await client.batch_update('S', [{'range': 'Current!A1', 'values': [[9]]},
+                                                {'range': 'Current!A1:A2', 'values': [[1], [2]]}])
+        return batch, await client.get('S', 'Current!A1:A2')
+
+    batch, values = run(server.url, writes)
+    assert [x.get('skipped', False) for x in batch['responses']] == [False, False]
+    assert values['values'] == [['1'], ['2']]
+
+
+def test_errors_are_raised(server):
+    with pytest.raises(Exception, match='404'):
+        run(server.url, lambda client: client._request('get', 'GET', 'S', '/nothing'))
+
+
+def test_rate_limited_requests_are_retried(cache):
+    service_ = spreadsheets.LocalService({'S': {'Sheet1': [['a']]}})
+    with LocalServer(service_, rate_limit=2, retry_after='0.2') as server:
+        start = time.perf_counter()
+        responses = run(server.url, lambda client: asyncio.gather(*(client.get('S', 'A1') for _ in range(4))))
+
+    assert [x['values'] for x in responses] == [[['a']]] * 4
+    assert server.statuses.count(429) > 0 and server.statuses.count(200) == 4
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_retry_after_is_capped(cache, monkeypatch):
+    monkeypatch.setattr(async_spreadsheets, 'max_backoff', 0.1)
+    monkeypatch.setattr(spreadsheets, 'num_retries', 30)
+    service_ = spreadsheets.LocalService({'S': {'Sheet1': [['a']]}})
+    with LocalServer(service_, rate_limit=1, retry_after='3600') as server:
+        start = time.perf_counter()
+        responses = run(server.url, lambda client: asyncio.gather(*(client.get('S', 'A1') for _ in range(2))))
+
+    assert len(responses) == 2
+    assert time.perf_counter() - start < 5
@@ -0,0 +1,64 @@
+"""Tests of channels, the channel map rules."""
+
+
+# Import Modules
+import pandas as pd
+import pytest
+import channels
+import toolbelt
+
+
+values = [
+    ['CHANNEL', 'BILL_TO_NAME', 'SALES_CHANNEL', 'CONTAINS'],
+    ['LOWES', 'LOWES COMPANIES INC', '', ''],
+    ['MENARDS', '', '', 'MENARDS'],
+    ['FSD', ' ', 'FIELD SALES', ''],
+    ['PARAMIT', 'PARAMIT', 'OTHER', ''],
+    ['', 'IGNORED', '', ''],
+    ['SHORT', 'SHORT ROW']
+]
+
+
+def test_from_values():
+    mapping = channels.ChannelMap.from_values(values, default='Other')
+
+    assert mapping.names == {'LOWES COMPANIES INC': 'LOWES', 'SHORT ROW': 'SHORT'}
+    assert mapping.contains == [('MENARDS', 'MENARDS')]
+    assert mapping.sales_channels == {'FIELD SALES': 'FSD'}
+    assert mapping.pairs == {('PARAMIT', 'OTHER'): 'PARAMIT'}
+    assert mapping.default == 'Other'
+
+    result = mapping(pd.Series(['LOWES COMPANIES INC', 'MENARDS INC', 'X', 'PARAMIT', 'PARAMIT', None]),
+                     pd.Series(['GIANTS', 'GIANTS', 'FIELD SALES', 'OTHER', 'GIANTS', 'OTHER']))
+    assert result.tolist() == ['LOWES', 'MENARDS', 'FSD', 'PARAMIT', 'Other', 'Other']
+
+
+def test_from_values_needs_every_column():
+    with pytest.raises(Exception, match='missing columns'):
+        channels.ChannelMap.from_values([['BILL_TO_NAME', 'CHANNEL']])
+
+
+@pytest.mark.parametrize('extension', ['csv', 'xlsx'])
+def test_from_file_round_trip(tmp_path, extension):
+    if extension == 'xlsx':
+        pytest.importorskip('openpyxl')
+    rows = toolbelt.channel_map.to_values()
+    location = str(tmp_path / ('Channel Map.' + extension))
+    table = pd.DataFrame(rows[1:], columns=rows[0])
+    if extension == 'csv':
+        table.to_csv(location, index=False)
+    else:
+        table.to_excel(location, index=False)
+
+    mapping = channels.ChannelMap.from_file(location)
+    assert mapping.to_values() == rows
+    assert mapping.channels() == toolbelt.channel_map.channels()
+
+
+def test_rule_changes_apply_to_later_calls():
+    mapping = channels.ChannelMap.from_values(toolbelt.channel_map.to_values())
+    assert mapping(pd.Series(['NEW CO']), pd.Series(['GIANTS'])).tolist() == ['Not Consumer']
+
+    mapping.names['NEW CO'] = 'LOWES'
+    assert mapping(pd.Series(['NEW CO']), pd.Series(['GIANTS'])).tolist() == ['LOWES']
+    assert mapping.channel('NEW CO', 'GIANTS') == 'LOWES'
@@ -0,0 +1,55 @@
+"""Tests that classify gives the same columns as the calc_* functions it replaces."""
+
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import pytest
+import benchmarks
+import toolbelt
+
+
+derived_columns = ['DISTRIBUTION_CHANNEL_1', 'DISTRIBUTION_CHANNEL_2', 'CARRIER_STATUS', 'DISTRIBUTION_STATUS']
+
+
+def extract(lines=5000, seed=0):
+    """Returns a generated Open Orders extract, before fillna, with missing values in the columns classify reads.
+
+        BILL_TO_NAME is never missing, calc_distribution_channel_2 cannot test a substring of a missing name.
+    """
+
+    data = benchmarks.open_orders(lines, seed)
+    rng = np.random.default_rng(seed)
+    for column in ['ORG', 'SALES_CHANNEL', 'LINE_STATUS', 'SHORTAGE_CATEGORY']:
+        data.loc[rng.random(lines) < 0.05, column] = np.nan
+    data.loc[rng.random(lines) < 0.02, 'BILL_TO_NAME'] = 'X MENARDS WEST'
+    return data
+
+
+def reference(data, carrier_status):
+    """Classifies data with the calc_* functions, like process_4 did."""
+
+    data = data.copy()
+    data['DISTRIBUTION_CHANNEL_1'] = data.apply(toolbelt.calc_distribution_channel_1, axis=1)
+    data['DISTRIBUTION_CHANNEL_2'] = data.apply(toolbelt.calc_distribution_channel_2, axis=1)
+    data['CARRIER_STATUS'] = data.apply(toolbelt.calc_carrier_status, axis=1, carrier_status=carrier_status)
+    data['DISTRIBUTION_STATUS'] = data.apply(toolbelt.calc_distribution_status, axis=1)
+    return data
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('kind', ['object', 'filled', 'compact'])
+def test_classify_equals_calc_functions(kind, seed):
+    data = extract(seed=seed)
+    carrier_status = benchmarks.carrier_status_table(300, data['ORDER_NUMBER'].unique(), seed)
+
+    if kind == 'filled':
+        data = data.fillna(0)
+    elif kind == 'compact':
+        data = toolbelt.compact(data, toolbelt.open_orders_schema)
+
+    expected = reference(data, carrier_status)
+    result = toolbelt.classify(data.copy(), carrier_status, categorical=kind == 'compact')
+
+    for column in derived_columns:
+        assert list(result[column].astype(str)) == list(expected[column].astype(str)), column
@@ -0,0 +1,30 @@
+"""Tests of criteria masks."""
+
+
+# Import Modules
+import pandas as pd
+import criteria
+import toolbelt
+from criteria import Col
+
+
+def test_masks_follow_in_place_edits():
+    data = pd.DataFrame({'ORG': ['OK', 'NO', 'NO'], 'DOLLARS': [3.0, 2.0, 3.0]})
+    assert toolbelt.sift_dollars(data, toolbelt.ok) == 3.0
+
+    data.loc[2, 'ORG'] = 'OK'
+    assert toolbelt.sift_dollars(data, toolbelt.ok) == 6.0
+
+    data['ORG'] = ['NO'] * 3
+    assert toolbelt.sift_dollars(data, toolbelt.ok) == 0.0
+    assert len(toolbelt.sift(data, toolbelt.ok)) == 0
+
+
+def test_masks_are_shared_inside_a_memoized_block():
+    data = pd.DataFrame({'ORG': ['OK', 'NO']})
+    ok = Col('ORG') == 'OK'
+
+    with criteria.memoized(data):
+        first = ok.mask(data)
+        assert ok.mask(data) is first
+    assert ok.mask(data) is not first
@@ -0,0 +1,95 @@
+"""Tests of exporting in the background."""
+
+
+# Import Modules
+import logging
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import exporting
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    """Holds exports until the returned event is set, exported frames are in its frames."""
+
+    release = threading.Event()
+    release.frames = []
+
+    def export(data, path, file_format=None, sheet_name='Line Detail'):
+        release.wait(5)
+        release.frames.append(data.copy())
+        if file_format == 'fail':
+            raise Exception('No such format: \'fail\'')
+        return {'path': path}
+
+    monkeypatch.setattr(exporting, 'export', export)
+    monkeypatch.setattr(exporting, 'pending', [])
+    return release
+
+
+def test_changes_after_export_later_are_not_exported(blocked):
+    data = pd.DataFrame({'ORDER_NUMBER': [1, 2], 'CHANNEL': ['Consumer', 'Not Consumer']})
+    exporting.export_later(data, 'Line Detail.xlsx')
+
+    data.loc[0, 'CHANNEL'] = 'Changed'
+    data['ORDER_NUMBER'] += 10
+    blocked.set()
+    exporting.wait()
+
+    assert blocked.frames[0]['CHANNEL'].tolist() == ['Consumer', 'Not Consumer']
+    assert blocked.frames[0]['ORDER_NUMBER'].tolist() == [1, 2]
+
+
+def test_errors_are_logged_without_wait(blocked, caplog):
+    with caplog.at_level(logging.ERROR, logger='exporting'):
+        future = exporting.export_later(pd.DataFrame({'A': [1]}), 'Line Detail.fail', 'fail')
+        blocked.set()
+        with pytest.raises(Exception):
+            future.result(5)
+        # Done callbacks can run just after result returns
+        exporting._executor.submit(lambda: None).result(5)
+
+    assert 'Export to Line Detail.fail failed' in caplog.text
+    with pytest.raises(Exception, match='No such format'):
+        exporting.wait()
+
+
+@pytest.mark.parametrize('copy_on_write', [True, False])
+def test_export_data_is_independent_without_copy_on_write(monkeypatch, copy_on_write):
+    """Without Copy-on-Write, e.g., pandas 2, changes would write into the exported buffers."""
+
+    exported = []
+    monkeypatch.setattr(exporting, 'export', lambda data, *args: exported.append(data))
+    monkeypatch.setattr(exporting, 'pending', [])
+    monkeypatch.setattr(exporting, '_copy_on_write', lambda: copy_on_write)
+
+    data = pd.DataFrame({'DOLLARS': [1.0, 2.0]})
+    exporting.export_later(data, 'Line Detail.xlsx')
+    exporting.wait()
+
+    shared = np.shares_memory(exported[0]['DOLLARS'].to_numpy(), data['DOLLARS'].to_numpy())
+    assert shared == copy_on_write
+
+
+def test_xlsx_is_written_in_blocks(tmp_path, monkeypatch):
+    pytest.importorskip('xlsxwriter')
+    pytest.importorskip('openpyxl')
+    monkeypatch.setattr(exporting, 'xlsx_block_rows', 3)
+
+    data = pd.DataFrame({
+        'ORDER_NUMBER': range(10),
+        'DOLLARS': [1.5, None] * 5,
+        'SHIP_DATE': pd.date_range('2024-01-01', periods=10),
+        'CHANNEL': pd.Categorical(['Consumer', 'Not Consumer'] * 5)
+    })
+    path = str(tmp_path / 'Line Detail.xlsx')
+    exporting.write_xlsx(data, path, 'Line Detail')
+
+    written = pd.read_excel(path, sheet_name='Line Detail')
+    assert len(written) == 10
+    assert written['ORDER_NUMBER'].tolist() == list(range(10))
+    assert written['SHIP_DATE'].tolist() == data['SHIP_DATE'].tolist()
+    assert written['CHANNEL'].tolist() == data['CHANNEL'].tolist()
+    assert written['DOLLARS'].iloc[::2].tolist() == [1.5] * 5
@@ -0,0 +1,10 @@
+"""Tests of the import time of toolbelt."""
+
+
+# Import Modules
+import benchmarks
+
+
+def test_toolbelt_import_budget():
+    result = benchmarks.check_import()
+    assert result['seconds'] <= benchmarks.import_budget
@@ -0,0 +1,34 @@
+"""Tests of instrument, the memory recorded for stages."""
+
+import numpy as np
+import pytest
+
+import instrument
+
+
+@pytest.fixture
+def records(monkeypatch):
+    monkeypatch.setattr(instrument, 'memory', 'rss')
+    monkeypatch.setattr(instrument, 'records', [])
+    if instrument._max_rss() is None:
+        pytest.skip('resident size is unknown on this platform')
+    return instrument.records
+
+
+def test_rss_is_growth_of_the_stage(records):
+    """A light stage after a heavy one records no growth, not the peak the heavy one reached."""
+
+    with instrument.measure('heavy') as heavy:
+        data = np.ones(50_000_000 // 8)
+        data += 1
+        del data
+    with instrument.measure('light') as light:
+        sum(range(1000))
+
+    # Earlier tests may have raised the process peak past what heavy needed
+    assert light.peak_memory < 5e6
+    assert light.process_peak_memory >= max(heavy.process_peak_memory, 50e6)
+
+    result = instrument.summary(records)
+    assert result.loc['light', 'peak_memory'] <= result.loc['heavy', 'peak_memory']
+    assert result.loc['light', 'process_peak_memory'] > result.loc['light', 'peak_memory']
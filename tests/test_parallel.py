@@ -0,0 +1,81 @@
+"""Tests that parallel gives the same columns and totals as toolbelt in one process."""
+
+
+# Import Modules
+import math
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import benchmarks
+import parallel
+import toolbelt
+
+
+@pytest.fixture
+def split(monkeypatch):
+    """Splits frames of any size between workers."""
+
+    monkeypatch.setattr(parallel, 'min_rows', 0)
+    yield
+    parallel.shutdown()
+
+
+def extract():
+    """Returns a generated extract of two concatenated reports, so its Arrow columns are chunked."""
+
+    data = pd.concat([benchmarks.open_orders(700, 0), benchmarks.open_orders(601, 1)], ignore_index=True).fillna(0)
+    return data, benchmarks.carrier_status_table(300, data['ORDER_NUMBER'].unique(), 0)
+
+
+def test_share_writes_one_batch_per_part():
+    import pyarrow as pa
+
+    data, _ = extract()
+    for parts in (1, 2, 3, 2000):
+        path = parallel.share(data[['ORDER_NUMBER', 'BILL_TO_NAME']], parts)
+        try:
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                rows = [reader.get_batch(i).num_rows for i in range(reader.num_record_batches)]
+        finally:
+            os.remove(path)
+        assert len(rows) == parts
+        assert sum(rows) == len(data)
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_classify_and_totals_equal_one_process(split, categorical):
+    data, carrier_status = extract()
+
+    expected = toolbelt.classify(data.copy(), carrier_status, categorical)
+    result = parallel.classify(data.copy(), carrier_status, categorical, workers=2)
+    assert len(result) == len(data)
+    for column in parallel.derived_columns:
+        assert result[column].astype(object).tolist() == expected[column].astype(object).tolist()
+
+    totals = parallel.backlog_breakdown_totals(result, workers=2)
+    expected_totals = toolbelt.backlog_breakdown_totals(expected, workers=1)
+    assert list(totals['cells']) == list(expected_totals['cells'])
+    for range_, rows in expected_totals['cells'].items():
+        assert np.allclose(totals['cells'][range_], rows)
+    for name in ('channels', 'statuses'):
+        assert totals[name].index.astype(str).tolist() == expected_totals[name].index.astype(str).tolist()
+        assert np.allclose(totals[name]['DOLLARS'], expected_totals[name]['DOLLARS'])
+
+
+def test_exact_sum_is_independent_of_order_and_split():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=5000) * 10.0 ** rng.integers(-8, 12, 5000)
+    values[::97] = np.nan
+    expected = math.fsum(values[~np.isnan(values)])
+
+    assert float(parallel.ExactSum(values)) == expected
+    for seed in range(5):
+        shuffled = np.random.default_rng(seed).permutation(values)
+        cuts = np.sort(np.random.default_rng(seed).integers(0, len(values), seed + 1))
+        parts = [parallel.ExactSum(part) for part in np.split(shuffled, cuts)]
+        assert float(sum(reversed(parts), parallel.ExactSum())) == expected
+
+    assert float(parallel.ExactSum()) == 0.0
+    assert float(parallel.ExactSum([1e16, 1.0, -1e16])) == 1.0
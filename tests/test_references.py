@@ -0,0 +1,53 @@
+"""Tests of references, tables kept until their sheet changes."""
+
+
+# Import Modules
+import references
+
+
+def table(revisions, ttl=0):
+    """Returns a ReferenceTable counting its fetches, its revision is the next of revisions."""
+
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return list(range(len(fetches)))
+
+    def revision():
+        value = revisions.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    return references.ReferenceTable('test', fetch, ttl=ttl, revision=revision, saved=False), fetches
+
+
+def test_fetched_again_only_when_the_revision_changes():
+    reference, fetches = table(['a', 'a', 'b'])
+
+    assert reference.get() == [0]
+    assert reference.get() == [0]
+    assert reference.get() == [0, 1]
+    assert len(fetches) == 2
+    assert reference.counts['checks'] == 2
+
+
+def test_fetched_again_when_the_revision_is_unknown():
+    reference, fetches = table(['a', Exception('Drive API is disabled'), None, None])
+
+    reference.get()
+    reference.get()
+    reference.get()
+    reference.get()
+    assert len(fetches) == 4
+    assert reference.counts['checks'] == 3
+
+
+def test_kept_while_younger_than_ttl():
+    reference, fetches = table(['a'], ttl=60)
+
+    reference.get()
+    reference.get()
+    assert len(fetches) == 1
+    assert reference.counts['checks'] == 0
@@ -0,0 +1,90 @@
+"""Tests of incremental refreshes with snapshot."""
+
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import benchmarks
+import channels
+import snapshot
+import toolbelt
+
+
+def extract(lines=2000, seed=0):
+    data = benchmarks.open_orders(lines, seed).fillna(0)
+    return data, benchmarks.carrier_status_table(100, data['ORDER_NUMBER'].unique(), seed)
+
+
+def full(data, carrier_status):
+    return toolbelt.backlog_breakdown_totals(toolbelt.classify(data.copy(), carrier_status))
+
+
+def assert_same_cells(result, expected):
+    assert list(result['cells']) == list(expected['cells'])
+    for range_, rows in expected['cells'].items():
+        assert np.allclose(result['cells'][range_], rows)
+
+
+def test_refresh_equals_full_totals():
+    data, carrier_status = extract()
+    previous = snapshot.refresh(data, carrier_status)
+    changed = data.copy()
+    changed.loc[:99, 'DOLLARS'] += 1.0
+
+    result = snapshot.refresh(changed, carrier_status, previous)
+    assert_same_cells(result.results(), full(changed, carrier_status))
+
+
+def test_refresh_after_channel_map_change(monkeypatch):
+    data, carrier_status = extract()
+    previous = snapshot.refresh(data, carrier_status)
+
+    mapping = channels.ChannelMap.from_values(toolbelt.channel_map.to_values())
+    mapping.names['BLISH-MIZE CO'] = 'ACE HDW'
+    monkeypatch.setattr(toolbelt, 'channel_map', mapping)
+
+    result = snapshot.refresh(data, carrier_status, previous)
+    assert_same_cells(result.results(), full(data, carrier_status))
+    assert (result.data['DISTRIBUTION_CHANNEL_2'][result.data['BILL_TO_NAME'] == 'BLISH-MIZE CO'] == 'ACE HDW').all()
+
+
+def test_refresh_after_cells_change(monkeypatch):
+    data, carrier_status = extract()
+    previous = snapshot.refresh(data, carrier_status)
+
+    cells = dict(toolbelt.backlog_breakdown_cells)
+    cells['Current!C30'] = cells.pop('Current!B30')
+    monkeypatch.setattr(toolbelt, 'backlog_breakdown_cells', cells)
+
+    result = snapshot.refresh(data, carrier_status, previous)
+    assert_same_cells(result.results(), full(data, carrier_status))
+
+
+def test_refresh_inserted_deleted_and_changed_lines():
+    data, carrier_status = extract()
+    previous = snapshot.refresh(data, carrier_status)
+
+    changed = data.drop(index=range(10, 20))
+    changed.loc[30:39, 'LINE_STATUS'] = 'Picked'
+    changed.loc[40:49, 'BILL_TO_NAME'] = 'LOWES COMPANIES INC'
+    changed = pd.concat([changed, data.iloc[:5].assign(ITEM_NO=-1)], ignore_index=True)
+
+    result = snapshot.refresh(changed, carrier_status, previous)
+    assert_same_cells(result.results(), full(changed, carrier_status))
+
+    expected = toolbelt.classify(changed.copy(), carrier_status)
+    for column in ['DISTRIBUTION_CHANNEL_2', 'DISTRIBUTION_STATUS', 'LINE_STATUS']:
+        assert result.data[column].tolist() == expected[column].tolist()
+    # Deleting a line renumbers the later repeats of its item, so counts of moves can be higher
+    moves = result.moves['MOVE'].value_counts()
+    assert moves['Deleted'] >= 10 and moves['Changed'] >= 20 and moves['Inserted'] >= 5
+    assert np.isclose(result.moves['DOLLARS_CHANGE'].sum(), changed['DOLLARS'].sum() - data['DOLLARS'].sum())
+
+
+def test_unchanged_refresh_moves_nothing():
+    data, carrier_status = extract()
+    previous = snapshot.refresh(data, carrier_status)
+
+    result = snapshot.refresh(data.copy(), carrier_status, previous)
+    assert result.moves.empty
+    assert_same_cells(result.results(), full(data, carrier_status))
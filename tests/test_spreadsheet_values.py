@@ -0,0 +1,94 @@
+"""Tests of the conversions between DataFrames and sheet values in spreadsheets."""
+
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import pytest
+import spreadsheets
+import toolbelt
+
+
+def test_values_leaves_df_unchanged():
+    df = pd.DataFrame({'DOLLARS': [1.5, np.nan]}, index=pd.Index(['A', 'B'], name='CHANNEL'))
+    before = df.copy()
+
+    result = spreadsheets.values(df, index=True)
+    assert result == [['CHANNEL', 'DOLLARS'], ['A', 1.5], ['B', '']]
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_missing_values_become_empty():
+    df = pd.DataFrame({
+        'FLOAT': [1.0, np.nan],
+        'OBJECT': ['x', None],
+        'STRING': pd.array(['y', None], dtype='string'),
+        'DATE': pd.to_datetime(['2024-01-02', None])
+    })
+    assert spreadsheets.values(df)[1:] == [[1.0, 'x', 'y', '2024-01-02'], ['', '', '', '']]
+
+
+def test_categorical_and_datetime_cells():
+    categories = pd.Series(pd.Categorical(['b', None, 'a', 'b'], categories=['a', 'b']))
+    assert spreadsheets.cells(categories) == ['b', '', 'a', 'b']
+
+    dates = pd.Series(pd.Categorical(pd.to_datetime(['2024-01-02', '2024-01-02'])))
+    assert spreadsheets.cells(dates) == ['2024-01-02', '2024-01-02']
+
+    times = pd.Series([pd.Timestamp('2024-01-02 03:04:05'), pd.Timestamp('2024-01-03'), pd.NaT])
+    assert spreadsheets.cells(times) == ['2024-01-02 03:04:05', '2024-01-03 00:00:00', '']
+
+    zoned = pd.Series(pd.to_datetime(['2024-01-02']).tz_localize('US/Central'))
+    assert spreadsheets.cells(zoned) == ['2024-01-02']
+
+    assert spreadsheets.cells(pd.Series([1, 2], dtype='int8')) == [1, 2]
+    assert spreadsheets.cells(pd.Series([True, False])) == [True, False]
+
+
+def test_df_pads_short_rows():
+    result = spreadsheets.df([['A', 'B', 'C'], ['x', '1'], ['y'], ['z', '2', 'w', 'extra']], dtypes=False)
+
+    assert result.columns.tolist() == ['A', 'B', 'C']
+    assert result.values.tolist() == [['x', '1', ''], ['y', '', ''], ['z', '2', 'w']]
+
+
+@pytest.mark.parametrize('cells, dtype', [
+    (['1', '2', '300'], np.int16),
+    (['1', '-2', '70000'], np.int32),
+    (['0.5', '1.25', ''], np.float32),
+    (['0.1', '1', '2'], np.float64),
+    (['12345678901', '1'], np.int64)
+])
+def test_numbers_are_downcast_exactly(cells, dtype):
+    result = spreadsheets.infer(pd.Series(cells, dtype=object))
+
+    assert result.dtype == dtype
+    expected = [float(x) if x else np.nan for x in cells]
+    assert np.array_equal(result.to_numpy(dtype=np.float64), expected, equal_nan=True)
+
+
+def test_text_columns_become_categories():
+    def inferred(cells):
+        return spreadsheets.infer(pd.Series(cells, dtype=object)).dtype
+
+    assert isinstance(inferred(['a', 'b', 'a', 'a']), pd.CategoricalDtype)
+    assert isinstance(inferred(['1', 'a', 'a', 'a']), pd.CategoricalDtype)
+    assert inferred(['a', 'b', 'c', 'd']) == object
+
+
+def test_carrier_status_has_an_int_index(monkeypatch):
+    spreadsheet_id = toolbelt.distribution_spreadsheets['Carrier Push']
+    values = [['ORDER_NUMBER', 'CARRIER_STATUS'], ['10000001', 'Overage'], ['10000002', 'Carrier Delay'],
+              ['10000001', 'Other'], ['10000003']]
+    spreadsheets.use_service(spreadsheets.LocalService({spreadsheet_id: {'Carrier Push': values}}))
+    monkeypatch.setattr(toolbelt.carrier_status_table, '_entry', None)
+    try:
+        result = toolbelt.get_carrier_status(refresh=True)
+    finally:
+        spreadsheets.use_service(None)
+
+    assert result.index.dtype.kind == 'i'
+    assert result.index.tolist() == [10000001, 10000002, 10000003]
+    assert result['CARRIER_STATUS'].astype(object).tolist() == ['Overage', 'Carrier Delay', '']
+    data = toolbelt.attach_carrier_status(pd.DataFrame({'ORDER_NUMBER': [10000002, 5]}), result)
+    assert data['CARRIER_STATUS'].tolist() == ['Carrier Delay', 'None']
@@ -0,0 +1,72 @@
+"""Tests of the spreadsheets write cache with a LocalService."""
+
+
+# Import Modules
+import pytest
+import spreadsheets
+
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    monkeypatch.setattr(spreadsheets, 'write_cache', str(tmp_path / 'sheets_cache.json'))
+    monkeypatch.setattr(spreadsheets, '_written', None)
+    service_ = spreadsheets.LocalService({'S': {'Sheet1': []}})
+    spreadsheets.use_service(service_)
+    yield service_
+    spreadsheets.use_service(None)
+
+
+def sheet_values(range_):
+    return spreadsheets.get('S', range_).get('values', [])
+
+
+def test_update_after_queued_clear_is_sent(local):
+    spreadsheets.update('S', 'A1:A2', [[1], [2]])
+    with spreadsheets.SheetBatch() as batch:
+        batch.clear('S', 'A1:A2')
+        future = batch.update('S', 'A1:A2', [[1], [2]])
+
+    assert not future.result().get('skipped')
+    assert sheet_values('A1:A2') == [['1'], ['2']]
+
+
+def test_update_after_queued_overlapping_update_is_sent(local):
+    spreadsheets.update('S', 'A1:A2', [[1], [2]])
+    with spreadsheets.SheetBatch() as batch:
+        batch.update('S', 'A1', [[9]])
+        future = batch.update('S', 'A1:A2', [[1], [2]])
+
+    assert not future.result().get('skipped')
+    assert sheet_values('A1:A2') == [['1'], ['2']]
+
+
+def test_unchanged_update_is_skipped(local):
+    spreadsheets.update('S', 'A1:A2', [[1], [2]])
+    with spreadsheets.SheetBatch() as batch:
+        future = batch.update('S', 'A1:A2', [[1], [2]])
+
+    assert future.result().get('skipped')
+    assert local.calls == ['update']
+
+
+def test_edit_seen_by_an_overlapping_get_sends_the_update(local):
+    spreadsheets.update('S', 'Sheet1!B6:B7', [[1], [2]])
+    spreadsheets.update('S', 'Sheet1!A3:B4', [[3, 4], [5, 6]])
+    assert sheet_values('B3:B47') == [['4'], ['6'], [], ['1'], ['2']]
+
+    # Edited elsewhere, only B6:B7 is covered by the cells that changed
+    local._write('S', 'Sheet1!B7', [['edited']])
+    assert sheet_values('B3:B47') == [['4'], ['6'], [], ['1'], ['edited']]
+
+    assert spreadsheets.update('S', 'Sheet1!A3:B4', [[3, 4], [5, 6]]).get('skipped')
+    assert not spreadsheets.update('S', 'Sheet1!B6:B7', [[1], [2]]).get('skipped')
+    assert sheet_values('B6:B7') == [['1'], ['2']]
+
+
+def test_unedited_overlapping_gets_keep_the_entry(local):
+    spreadsheets.update('S', 'Sheet1!B6:B7', [[1], [2]])
+    for _ in range(2):
+        assert sheet_values('B3:B47') == [[], [], [], ['1'], ['2']]
+        assert sheet_values('B7:C7') == [['2']]
+
+    assert spreadsheets.update('S', 'Sheet1!B6:B7', [[1], [2]]).get('skipped')
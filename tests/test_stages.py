@@ -0,0 +1,66 @@
+"""Tests of stages, running report stages in dependency order."""
+
+
+# Import Modules
+import threading
+import time
+import pytest
+import stages
+
+
+def test_stages_run_after_their_inputs():
+    finished = []
+    lock = threading.Lock()
+
+    def step(name, seconds):
+        def function(*inputs):
+            time.sleep(seconds)
+            with lock:
+                finished.append(name)
+            return name + ''.join(inputs)
+        return function
+
+    run_stages = [
+        stages.Stage('write', step('write', 0), ['slow', 'fast']),
+        stages.Stage('slow', step('slow', 0.2)),
+        stages.Stage('fast', step('fast', 0)),
+        stages.Stage('after', step('after', 0), ['write'])
+    ]
+    results, timings = stages.run(run_stages)
+
+    assert results['write'] == 'writeslowfast'
+    assert results['after'] == 'afterwriteslowfast'
+    assert finished.index('write') > finished.index('slow')
+    assert finished[-1] == 'after'
+    assert set(timings) == {'write', 'slow', 'fast', 'after'}
+
+
+def test_circular_inputs_raise():
+    run_stages = [
+        stages.Stage('ready', lambda: 1),
+        stages.Stage('a', lambda b: b, ['b']),
+        stages.Stage('b', lambda a: a, ['a'])
+    ]
+    with pytest.raises(Exception, match='circular inputs'):
+        stages.run(run_stages)
+
+
+def test_unknown_inputs_raise():
+    with pytest.raises(Exception, match='unknown inputs'):
+        stages.run([stages.Stage('a', lambda b: b, ['b'])])
+
+
+def test_main_updates_after_process_1(monkeypatch):
+    """process_1 reads the Current column update_backlog_breakdown writes, so it goes first."""
+
+    import toolbelt
+    inputs = {}
+
+    def run(run_stages, *args, **kwargs):
+        inputs.update({stage.name: stage.inputs for stage in run_stages})
+        raise StopIteration
+
+    monkeypatch.setattr(stages, 'run', run)
+    with pytest.raises(StopIteration):
+        toolbelt.main()
+    assert 'process_1' in inputs['update_backlog_breakdown']
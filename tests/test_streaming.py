@@ -0,0 +1,60 @@
+"""Tests that streaming gives the same totals as processing the report in memory."""
+
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import pytest
+import benchmarks
+import streaming
+import toolbelt
+
+
+lines = 1003
+
+
+@pytest.fixture
+def report(tmp_path, monkeypatch):
+    """Returns the paths of a generated report as .xlsx and .csv, and its in-memory results."""
+
+    pytest.importorskip('openpyxl')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(toolbelt, '_reports', {})
+
+    data = benchmarks.open_orders(lines, 0)
+    carrier_status = benchmarks.carrier_status_table(100, data['ORDER_NUMBER'].unique(), 0)
+    benchmarks.write_report(data, 'Open_Orders_Extract.xlsx')
+    with open('Open_Orders_Extract.csv', 'w', newline='') as file:
+        file.write('Open_Orders_Extract\n')
+        data.to_csv(file, index=False)
+
+    read = toolbelt.read('Open_Orders_Extract', 'Open_Orders_Extract.xlsx', usecols=toolbelt.open_orders_columns)
+    expected = toolbelt.backlog_breakdown_totals(toolbelt.classify(read.copy(), carrier_status), workers=1)
+    expected['late_trucks'] = toolbelt.process_3(data=read)
+    assert len(expected['late_trucks']) and len(expected['channels']) and len(expected['statuses'])
+    return carrier_status, expected
+
+
+def assert_same_pivot(result, expected):
+    assert result.index.tolist() == expected.index.tolist()
+    assert np.allclose(result['DOLLARS'], expected['DOLLARS'])
+
+
+@pytest.mark.parametrize('compact', [True, False])
+@pytest.mark.parametrize('extension', ['xlsx', 'csv'])
+def test_stream_equals_in_memory(report, extension, compact):
+    carrier_status, expected = report
+    assert lines % 250
+
+    result = streaming.stream('Open_Orders_Extract.' + extension, carrier_status, 'Line Detail.csv', chunksize=250, compact=compact)
+
+    assert list(result['cells']) == list(expected['cells'])
+    for range_, rows in expected['cells'].items():
+        assert np.allclose(result['cells'][range_], rows)
+    assert_same_pivot(result['channels'], expected['channels'])
+    assert_same_pivot(result['statuses'], expected['statuses'])
+    assert_same_pivot(result['late_trucks'].sort_index(), expected['late_trucks'].sort_index())
+
+    line_detail = pd.read_csv('Line Detail.csv')
+    assert line_detail.columns.tolist() == toolbelt.line_detail_columns
+    assert len(line_detail) == lines
@@ -0,0 +1,78 @@
+"""Tests of toolbelt lookups, report reads and Backlog Breakdown cells."""
+
+
+# Import Modules
+import os
+import pandas as pd
+import pytest
+import benchmarks
+import spreadsheets
+import toolbelt
+
+
+def test_empty_carrier_status_table():
+    carrier_status = spreadsheets.df([['ORDER_NUMBER', 'CARRIER_STATUS']], index='ORDER_NUMBER')
+    data = pd.DataFrame({'ORDER_NUMBER': [1, 2]})
+
+    result = toolbelt.attach_carrier_status(data, carrier_status)
+    assert list(result['CARRIER_STATUS']) == ['None', 'None']
+
+
+def test_carrier_status_lookup():
+    carrier_status = pd.DataFrame({'CARRIER_STATUS': ['Overage', 'Carrier Delay', 'Other']}, index=[1, 3, 1])
+    lookup = toolbelt.Lookup(carrier_status, 'CARRIER_STATUS')
+
+    assert list(lookup(pd.Series([1, 2, 3]))) == ['Overage', 'None', 'Carrier Delay']
+
+
+def write_report(path, data):
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame([['title']]).to_excel(writer, sheet_name='ReportOutput', index=False, header=False)
+        data.to_excel(writer, sheet_name='ReportOutput', index=False, startrow=1)
+
+
+def test_read_keeps_only_the_latest_sidecars(tmp_path, monkeypatch):
+    monkeypatch.setattr(toolbelt, '_reports', {})
+    path = str(tmp_path / 'Backlog.xlsx')
+    cache = tmp_path / toolbelt.report_cache
+
+    write_report(path, pd.DataFrame({'A': [1, 2]}))
+    toolbelt.read('Backlog', path)
+    toolbelt.read('Backlog', path, usecols=['A'])
+    assert len(list(cache.iterdir())) == 2
+
+    write_report(path, pd.DataFrame({'A': [1, 2, 3]}))
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert len(toolbelt.read('Backlog', path)) == 3
+    assert len(list(cache.iterdir())) == 1
+
+
+def test_read_parses_again_when_a_sidecar_cannot_be_loaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(toolbelt, '_reports', {})
+    path = str(tmp_path / 'Backlog.xlsx')
+    write_report(path, pd.DataFrame({'A': [1, 2]}))
+    toolbelt.read('Backlog', path)
+
+    sidecar = next((tmp_path / toolbelt.report_cache).iterdir())
+    monkeypatch.setattr(pd, 'read_pickle', lambda *args, **kwargs: (_ for _ in ()).throw(AttributeError('old pandas')))
+    monkeypatch.setattr(toolbelt, '_reports', {})
+    assert list(toolbelt.read('Backlog', path)['A']) == [1, 2]
+    assert sidecar.exists()
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_report_dollars_equals_sift_dollars(compact):
+    data = benchmarks.open_orders(5000, 0).fillna(0)
+    carrier_status = benchmarks.carrier_status_table(300, data['ORDER_NUMBER'].unique(), 0)
+    if compact:
+        data = toolbelt.compact(data, toolbelt.open_orders_schema)
+    data = toolbelt.classify(data, carrier_status, categorical=compact)
+
+    result = toolbelt.report_dollars(data, toolbelt.backlog_breakdown_cells)
+    assert list(result) == list(toolbelt.backlog_breakdown_cells)
+    for range_, rows in toolbelt.backlog_breakdown_cells.items():
+        assert len(result[range_]) == len(rows)
+        for value, row in zip(result[range_], rows):
+            assert value[0] == pytest.approx(toolbelt.sift_dollars(data, *row), rel=1e-10, abs=1e-10)
+            assert value[0] == pytest.approx(float(toolbelt.sift(data, *row)['DOLLARS'].sum()), rel=1e-10, abs=1e-10)
+    assert any(value[0] for rows in result.values() for value in rows)
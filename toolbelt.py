@@ -1,9 +1,25 @@
 """Module to define common functions and variable for reporting the backlog."""
 
 # Import Modules
+import functools
+import glob
+import hashlib
+import logging
+import os
+import sys
+import numpy as np
 import pandas as pd
-from IPython.display import display
+import channels
+import exporting
+import instrument
+import parallel
+import references
 import spreadsheets
+import stages
+import criteria
+from criteria import Col
+
+logger = logging.getLogger(__name__)
 
 # Data for google sheets spreadsheet ID's.
 distribution_spreadsheets = {
@@ -12,51 +28,227 @@ distribution_spreadsheets = {
 }
 
 # Sifting criteria Criteria
-ok_consumer = 'data["DISTRIBUTION_CHANNEL_1"] == "OK Consumer"'
-no = 'data["ORG"] == "NO"'
-ok = 'data["ORG"] == "OK"'
-
-backlog = 'data["SHIP_DATE_CATEGORY"] == "Late"'
-
-other = 'data["SALES_CHANNEL"] == "OTHER"'
-international = 'data["SALES_CHANNEL"] == "INTERNATIONAL"'
-ace = 'data["DISTRIBUTION_CHANNEL_2"] == "ACE HDW"'
-kilgore = 'data["SHIP_TO_NAME"] == "ORGILL INC - KILGORE - W 006"'
-orgill = 'data["DISTRIBUTION_CHANNEL_2"] == "ORGILL"'
-not_kilgore = 'data["SHIP_TO_NAME"] != "ORGILL INC - KILGORE - W 006"'
-fsd = 'data["DISTRIBUTION_CHANNEL_2"] == "DISTRIBUTORS&FIELD SALES"'
-blish = 'data["BILL_TO_NAME"] == "BLISH-MIZE CO"'
-ecommerce = 'data["DISTRIBUTION_CHANNEL_2"] == "ECOMMERCE"'
-lowes = 'data["DISTRIBUTION_CHANNEL_2"] == "LOWES"'
-home_depot = 'data["DISTRIBUTION_CHANNEL_2"] == "HOME DEPOT"'
-home_depot_dotcom = 'data["DISTRIBUTION_CHANNEL_2"] == "HOME DEPOT.COM"'
-menards = 'data["DISTRIBUTION_CHANNEL_2"] == "MENARDS"'
-
-shortage = 'data["DISTRIBUTION_STATUS"] == "Shortage"'
-covered_ready = 'data["DISTRIBUTION_STATUS"] == "Covered - Ready"'
-covered_not_ready = 'data["DISTRIBUTION_STATUS"] == "Covered - Not Ready"'
-picked = 'data["DISTRIBUTION_STATUS"] == "Picked"'
-released = 'data["DISTRIBUTION_STATUS"] == "Released"'
-customer_transportation = 'data["CARRIER_STATUS"] != "None"'
-overage = 'data["CARRIER_STATUS"] == "Overage"'
-carrier_delay = 'data["CARRIER_STATUS"] == "Carrier Delay"'
-t_m_delay = 'data["CARRIER_STATUS"] == "Transportation Management Delay"'
-
-
-def read(report_name, report_location):
-    """Reads standard M-D reports from .xlsx into DataFrame.
+ok_consumer = Col("DISTRIBUTION_CHANNEL_1") == "OK Consumer"
+no = Col("ORG") == "NO"
+ok = Col("ORG") == "OK"
+
+backlog = Col("SHIP_DATE_CATEGORY") == "Late"
+
+other = Col("SALES_CHANNEL") == "OTHER"
+international = Col("SALES_CHANNEL") == "INTERNATIONAL"
+ace = Col("DISTRIBUTION_CHANNEL_2") == "ACE HDW"
+kilgore = Col("SHIP_TO_NAME") == "ORGILL INC - KILGORE - W 006"
+orgill = Col("DISTRIBUTION_CHANNEL_2") == "ORGILL"
+not_kilgore = Col("SHIP_TO_NAME") != "ORGILL INC - KILGORE - W 006"
+fsd = Col("DISTRIBUTION_CHANNEL_2") == "DISTRIBUTORS&FIELD SALES"
+blish = Col("BILL_TO_NAME") == "BLISH-MIZE CO"
+ecommerce = Col("DISTRIBUTION_CHANNEL_2") == "ECOMMERCE"
+lowes = Col("DISTRIBUTION_CHANNEL_2") == "LOWES"
+home_depot = Col("DISTRIBUTION_CHANNEL_2") == "HOME DEPOT"
+home_depot_dotcom = Col("DISTRIBUTION_CHANNEL_2") == "HOME DEPOT.COM"
+menards = Col("DISTRIBUTION_CHANNEL_2") == "MENARDS"
+
+shortage = Col("DISTRIBUTION_STATUS") == "Shortage"
+covered_ready = Col("DISTRIBUTION_STATUS") == "Covered - Ready"
+covered_not_ready = Col("DISTRIBUTION_STATUS") == "Covered - Not Ready"
+picked = Col("DISTRIBUTION_STATUS") == "Picked"
+released = Col("DISTRIBUTION_STATUS") == "Released"
+customer_transportation = Col("CARRIER_STATUS") != "None"
+overage = Col("CARRIER_STATUS") == "Overage"
+carrier_delay = Col("CARRIER_STATUS") == "Carrier Delay"
+t_m_delay = Col("CARRIER_STATUS") == "Transportation Management Delay"
+
+late_truck = backlog & ok & (Col("SHIPPING_CATEGORY") == "TRUCK") & Col("SALES_CHANNEL").isin(["DISTRIBUTORS", "FIELD SALES", "GIANTS" , "ECOMMERCE"])
+late_truck_index = ['ORDER_NUMBER', 'BILL_TO_NAME', 'SHIP_TO_NAME']
+
+# Backlog Breakdown cells, each range maps to the criteria of each row in the range.
+backlog_breakdown_cells = {
+    'Current!B6:B10': [(ok_consumer, backlog, ace, shortage),
+                       (ok_consumer, backlog, ace, covered_ready),
+                       (ok_consumer, backlog, ace, picked),
+                       (ok_consumer, backlog, ace, released),
+                       (ok_consumer, backlog, ace, customer_transportation)],
+    'Current!B12:B21': [(ok_consumer, backlog, kilgore, shortage),
+                        (ok_consumer, backlog, kilgore, covered_ready),
+                        (ok_consumer, backlog, kilgore, picked),
+                        (ok_consumer, backlog, kilgore, released),
+                        (ok_consumer, backlog, kilgore, customer_transportation),
+                        (ok_consumer, backlog, orgill, not_kilgore, shortage),
+                        (ok_consumer, backlog, orgill, not_kilgore, covered_ready),
+                        (ok_consumer, backlog, orgill, not_kilgore, picked),
+                        (ok_consumer, backlog, orgill, not_kilgore, released),
+                        (ok_consumer, backlog, orgill, not_kilgore, covered_not_ready)],
+    'Current!B23:B28': [(ok_consumer, backlog, fsd, shortage),
+                        (ok_consumer, backlog, fsd, covered_ready),
+                        (ok_consumer, backlog, fsd, picked),
+                        (ok_consumer, backlog, fsd, released),
+                        (ok_consumer, backlog, fsd, customer_transportation),
+                        (ok_consumer, backlog, fsd, covered_not_ready)],
+    'Current!B30': [(ok_consumer, backlog, ecommerce, shortage)],
+    'Current!B33:35': [(ok_consumer, backlog, lowes, overage),
+                       (ok_consumer, backlog, lowes, carrier_delay),
+                       (ok_consumer, backlog, lowes, t_m_delay)],
+    'Current!B39:42': [(ok_consumer, backlog, home_depot, overage),
+                       (ok_consumer, backlog, home_depot, carrier_delay),
+                       (ok_consumer, backlog, home_depot, t_m_delay)],
+    'Current!B44': [(ok_consumer, backlog, menards, shortage)]
+}
+
+
+# Open_Orders_Extract columns used by process_3 and process_4, read once and shared
+open_orders_columns = ['SHIP_DATE_CATEGORY',
+                       'ORDER_NUMBER',
+                       'DOLLARS',
+                       'CASES',
+                       'ORG',
+                       'SALES_CHANNEL',
+                       'BILL_TO_NAME',
+                       'SHIP_TO_NAME',
+                       'SHIP_DATE',
+                       'SHIPPING_METHOD',
+                       'SHIPPING_CATEGORY',
+                       'LINE_STATUS',
+                       'SHORTAGE_CATEGORY',
+                       'ITEM_NO',
+                       'ITEM_DESCRIPTION',
+                       'PIECE_QTY',
+                       'Open Orders',
+                       'DISTRIBUTION_ONHAND',
+                       'RESERVED_QUANTITY']
+
+# Column types of Open_Orders_Extract for compact reads, see compact
+open_orders_schema = {'SHIP_DATE_CATEGORY': 'category',
+                      'ORDER_NUMBER': 'number',
+                      'DOLLARS': 'number',
+                      'CASES': 'number',
+                      'ORG': 'category',
+                      'SALES_CHANNEL': 'category',
+                      'BILL_TO_NAME': 'category',
+                      'SHIP_TO_NAME': 'category',
+                      'SHIP_DATE': 'date',
+                      'SHIPPING_METHOD': 'category',
+                      'SHIPPING_CATEGORY': 'category',
+                      'LINE_STATUS': 'category',
+                      'SHORTAGE_CATEGORY': 'category',
+                      'ITEM_NO': 'category',
+                      'ITEM_DESCRIPTION': 'category',
+                      'PIECE_QTY': 'number',
+                      'Open Orders': 'number',
+                      'DISTRIBUTION_ONHAND': 'number',
+                      'RESERVED_QUANTITY': 'number'}
+
+# Backlog columns used by process_2
+backlog_columns = ['Shipping Org', 'Days Late', 'Order Type', 'Bill To Customer', 'Sales Channel', 'Amount']
+
+# Columns of Line Detail, written by process_4
+line_detail_columns = ['DISTRIBUTION_CHANNEL_1',
+                       'DISTRIBUTION_CHANNEL_2',
+                       'DISTRIBUTION_STATUS',
+                       'SHIP_DATE_CATEGORY',
+                       'ORDER_NUMBER',
+                       'DOLLARS',
+                       'CASES',
+                       'ORG',
+                       'SALES_CHANNEL',
+                       'BILL_TO_NAME',
+                       'SHIP_TO_NAME',
+                       'SHIP_DATE',
+                       'SHIPPING_METHOD',
+                       'SHIPPING_CATEGORY',
+                       'LINE_STATUS',
+                       'CARRIER_STATUS',
+                       'SHORTAGE_CATEGORY',
+                       'ITEM_NO',
+                       'ITEM_DESCRIPTION',
+                       'PIECE_QTY',
+                       'Open Orders',
+                       'DISTRIBUTION_ONHAND',
+                       'RESERVED_QUANTITY']
+
+# Measurements of each main run are saved here, see instrument.report
+run_report = 'Run Report.json'
+
+# Reports already parsed by this process, see read
+_reports = {}
+
+# Folder, next to each report, holding pickled copies of parsed reports
+report_cache = '.report_cache'
+
+
+def excel_engine():
+    """Returns the fastest installed pandas.read_excel engine, None lets pandas choose."""
+    
+    try:
+        import python_calamine
+        return 'calamine'
+    except ImportError:
+        return None
+
+
+def compact(data, schema):
+    """Converts columns of data to compact dtypes and fills missing values per type.
+    
+        Schema types are 'category' (missing values become ''), 'number' (missing values become
+        0, see spreadsheets.downcast), 'date' and 'text'
+        (missing values become ''). Columns not in schema are filled with 0, like read does.
+        The bytes saved are logged and kept in result.attrs['memory_saved'].
+    
+        Args:
+            data(pandas.DataFrame): Report data as read from Excel, before fillna.
+            schema(dict): Column name to type, e.g., open_orders_schema.
+            
+        Returns:
+            result(pandas.DataFrame): Compact copy of data.
+    """
+    
+    result = {}
+    for column in data.columns:
+        kind = schema.get(column)
+        series = data[column]
+        
+        if kind == 'category':
+            result[column] = series.astype(object).fillna('').astype('category')
+        elif kind == 'number':
+            numbers = pd.to_numeric(series, errors='coerce').fillna(0)
+            result[column] = spreadsheets.downcast(numbers)
+        elif kind == 'date':
+            result[column] = pd.to_datetime(series, errors='coerce')
+        elif kind == 'text':
+            result[column] = series.astype(object).fillna('')
+        else:
+            result[column] = series.fillna(0)
+    result = pd.DataFrame(result, index=data.index)
+    
+    before = int(data.memory_usage(deep=True).sum())
+    after = int(result.memory_usage(deep=True).sum())
+    result.attrs['memory_saved'] = before - after
+    logger.info('Compacted %d rows from %.1f MB to %.1f MB', len(result), before / 1e6, after / 1e6)
+    
+    return result
+
+
+def parse(report_name, report_location, usecols=None, engine=None, schema=None):
+    """Parses standard M-D reports from .xlsx into DataFrame, see read.
     
         Args:
             report_name(str): Name of report, e.g., 'Backlog_Report', 'Open_Orders_Extract'.
             report_location(str): File location.
+            usecols(list): Only read these columns, ignored for 'Backlog_Report'.
+            engine(str): pandas.read_excel engine, e.g., 'calamine', 'openpyxl'.
+            schema(dict): Column types to compact the report with instead of fillna(0), see compact.
             
         Returns:
             result(pandas.DataFrame): Report data.
     """
     
+    kwargs = {'sheet_name': 'ReportOutput', 'header': 0, 'engine': engine}
+    if usecols is not None:
+        columns = set(usecols)
+        kwargs['usecols'] = lambda column: column in columns
+    
     # Backlog_Report no longer a valid report
     if report_name == 'Backlog_Report':
-        result = pd.read_excel(report_location, sheet_name='ReportOutput', header=0, skiprows=2, index_col=0)
+        result = pd.read_excel(report_location, sheet_name='ReportOutput', header=0, skiprows=2, index_col=0, engine=engine)
         result = result.fillna(0)
         result.drop(['SALES_CHANNEL', 'BUSINESS_CAT', 'Group Total', 'GrandTotal'], inplace=True)
         result = result[result.index.notnull()]
@@ -64,33 +256,135 @@ def read(report_name, report_location):
         
     # Open orders extract contains most info
     elif report_name == 'Open_Orders_Extract':
-        result = pd.read_excel(report_location, sheet_name='ReportOutput', header=0, skiprows=1)
-        result = result.fillna(0)
+        result = pd.read_excel(report_location, skiprows=1, **kwargs)
+        result = compact(result, schema) if schema else result.fillna(0)
         
     # Backlog report contains dropship orders
     elif report_name == 'Backlog':
-        result = pd.read_excel(report_location, sheet_name='ReportOutput', header=0, skiprows=1)
-        result = result.fillna(0)
+        result = pd.read_excel(report_location, skiprows=1, **kwargs)
+        result = compact(result, schema) if schema else result.fillna(0)
     else:
         raise Exception('No such report: \'{0}\''.format(report_name))
     return result
 
+
+# Used in read
+def _remove_sidecars(path, version):
+    """Removes the report_cache copies of the report at path made from other versions of the file."""
+    
+    pattern = os.path.join(os.path.dirname(path), report_cache, glob.escape(os.path.basename(path)) + '.*.pkl')
+    for sidecar in glob.glob(pattern):
+        if os.path.basename(sidecar)[len(os.path.basename(path)) + 1:].split('.')[0] != version:
+            try:
+                os.remove(sidecar)
+            except OSError:
+                pass
+
+@instrument.measured()
+def read(report_name, report_location, usecols=None, engine=None, cache=True, schema=None):
+    """Reads standard M-D reports from .xlsx into DataFrame.
+    
+        A report is parsed once per process and file version (path, modified time and size), and a
+        pickled copy is kept in report_cache so runs on an unchanged file skip parsing the .xlsx.
+        Copies of older versions of the file are removed when a new one is kept.
+    
+        Args:
+            report_name(str): Name of report, e.g., 'Backlog_Report', 'Open_Orders_Extract'.
+            report_location(str): File location.
+            usecols(list): Only read these columns, e.g., open_orders_columns.
+            engine(str): pandas.read_excel engine, defaults to excel_engine().
+            cache(bool): Use the in-process and on-disk caches.
+            schema(dict): Column types to compact the report with, e.g., open_orders_schema.
+            
+        Returns:
+            result(pandas.DataFrame): Report data.
+    """
+    
+    instrument.add(bytes_=os.path.getsize(report_location))
+    if engine is None:
+        engine = excel_engine()
+    if not cache:
+        return parse(report_name, report_location, usecols, engine, schema)
+    
+    stat = os.stat(report_location)
+    path = os.path.abspath(report_location)
+    key = (report_name, path, stat.st_mtime_ns, stat.st_size,
+           tuple(usecols) if usecols is not None else None,
+           tuple(sorted(schema.items())) if schema else None)
+    
+    if key not in _reports:
+        # Sidecars are named by file version, then by the way it was read, see _remove_sidecars
+        version = hashlib.sha1(repr(key[1:4]).encode()).hexdigest()[:16]
+        variant = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        sidecar = os.path.join(os.path.dirname(path), report_cache, '{0}.{1}.{2}.pkl'.format(os.path.basename(path), version, variant))
+        
+        try:
+            result = pd.read_pickle(sidecar)
+        except FileNotFoundError:
+            result = None
+        # A pickle written by another pandas version can fail in many ways, so the report is parsed again
+        except Exception as error:
+            logger.warning('Could not load %s, parsing the report again: %r', sidecar, error)
+            result = None
+        
+        if result is None:
+            result = parse(report_name, report_location, usecols, engine, schema)
+            try:
+                os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+                _remove_sidecars(path, version)
+                result.to_pickle(sidecar)
+            except OSError:
+                pass
+            
+        _reports[key] = result
+    
+    return _reports[key].copy()
+
 # Used in other functions
 def sift(data, *args):
     """Sifts data for records that match args criteria."""
     
-    data = data.copy()
-    
-    for criteria in args:
-        data = data[eval(criteria)]
-        
-    return data
+    return data[criteria.mask(data, *args)]
 
 # Used in other functions
-def sift_dollars(*args):
+def sift_dollars(data, *args):
     """Sums dollars sifted through the sift method."""
     
-    return sum(sift(*args)['DOLLARS'])
+    return float(data['DOLLARS'].to_numpy()[criteria.mask(data, *args)].sum())
+
+# Used in program_2
+def report_dollars(data, cells, total=None):
+    """Sums dollars for every cell of a report spec like backlog_breakdown_cells.
+    
+        Each distinct criteria prefix is evaluated once and shared between cells, so the
+        frame is never copied and every criteria mask is only computed once.
+    
+        Args:
+            data(pandas.DataFrame): Data categorized by process_4.
+            cells(dict): Range name to a list of criteria tuples, one per row in the range.
+            total(callable): Sums the DOLLARS array of a cell, defaults to a float numpy sum.
+            
+        Returns:
+            result(dict): Range name to values list, e.g., {'Current!B30': [[1234.5]]}.
+    """
+    
+    if total is None:
+        total = lambda dollars: float(dollars.sum())
+    
+    dollars = data['DOLLARS'].to_numpy()
+    masks = {(): np.ones(len(data), dtype=bool)}
+    
+    def mask(row):
+        if row not in masks:
+            masks[row] = mask(row[:-1]) & criteria.mask(data, row[-1])
+        return masks[row]
+    
+    result = {}
+    with criteria.memoized(data):
+        for range_, rows in cells.items():
+            result[range_] = [[total(dollars[mask(row)])] for row in rows]
+        
+    return result
 
 # Used to categorize consumer orders to the best of my knowledge, I don't know the actual logic, I'm sure its in oracle somewhere.
 def calc_distribution_channel_1(data):
@@ -156,9 +450,38 @@ def calc_distribution_status(data):
     else:
         return 'Other'
 
-# Get data that is in google sheets, not in Oracle
-def get_carrier_status():
-    """Gets the carrier_status table from google sheets."""
+class Lookup:
+    """Keyed lookup of one column of a sheet-backed table, e.g., the carrier_status table.
+    
+        Keys are matched through a hash join on the table index instead of scanning it per line.
+        
+        Args:
+            table(pandas.DataFrame): Table indexed by key, duplicate keys keep the first row.
+            column(str): Column to look up.
+            default: Value assigned to keys that are not in the table.
+    """
+    
+    def __init__(self, table, column, default='None'):
+        self.table = table[~table.index.duplicated(keep='first')]
+        self.column = column
+        self.default = default
+        
+    def __len__(self):
+        return len(self.table)
+        
+    def __call__(self, keys):
+        """Returns the looked up values for keys as an array aligned with keys."""
+        
+        positions = self.table.index.get_indexer(keys)
+        values = self.table[self.column].to_numpy(dtype=object)
+        result = np.full(len(positions), self.default, dtype=object)
+        found = positions >= 0
+        result[found] = values[positions[found]]
+        return result
+
+# Used in carrier_status_table
+def fetch_carrier_status():
+    """Downloads the carrier_status table from google sheets."""
     
     # Get Data
     values = spreadsheets.get(distribution_spreadsheets['Carrier Push'], 'Carrier Push')['values']
@@ -173,42 +496,168 @@ def get_carrier_status():
 
     return result
 
+# Carrier Push table, its Drive revision is checked once it is older than ttl seconds and it is
+# fetched again only if the sheet changed, see references.ReferenceTable
+carrier_status_table = references.ReferenceTable('carrier_status', fetch_carrier_status, ttl=60,
+                                                 revision=references.drive_revision(distribution_spreadsheets['Carrier Push']))
+
+# Get data that is in google sheets, not in Oracle
+def get_carrier_status(refresh=False):
+    """Gets the carrier_status table from google sheets, or the cached copy while it is fresh.
+    
+        Args:
+            refresh(bool): Download the table even if the cached copy is fresh.
+    """
+    
+    return carrier_status_table.get(refresh)
+
+# Used to read several sheet ranges at once, e.g., tabs of distribution_spreadsheets
+def get_ranges(ranges, max_concurrency=None):
+    """Gets ranges concurrently with async_spreadsheets instead of one request after another.
+    
+        async_spreadsheets is only imported here, so runs that do not use it never load it.
+    
+        Args:
+            ranges(dict): Name to (spreadsheet ID, range).
+            max_concurrency(int): Most requests in flight at once, see async_spreadsheets.Client.
+            
+        Returns:
+            values(dict): Name to values list of the range.
+    """
+    
+    import asyncio
+    import async_spreadsheets
+    
+    async def gather():
+        async with async_spreadsheets.Client(max_concurrency=max_concurrency) as client:
+            responses = await asyncio.gather(*(client.get(spreadsheet_id, range_) for spreadsheet_id, range_ in ranges.values()))
+        return {name: response.get('values', []) for name, response in zip(ranges, responses)}
+    
+    return async_spreadsheets.run(gather())
+
 # Get data that is in google sheets, not in Oracle
 def calc_carrier_status(data, carrier_status):
     """Assigns a carrier status to data according to carrier_status table"""
 
-    if data['ORDER_NUMBER'] in list(carrier_status.index):
+    if data['ORDER_NUMBER'] in carrier_status.index:
         return carrier_status['CARRIER_STATUS'][data['ORDER_NUMBER']]
     else:
         return 'None'
 
+# Join based equivalent of calc_carrier_status, used in classify
+def attach_carrier_status(data, carrier_status, categorical=False):
+    """Assigns CARRIER_STATUS to data by joining ORDER_NUMBER against the carrier_status table."""
+    
+    lookup = Lookup(carrier_status, 'CARRIER_STATUS')
+    result = lookup(data['ORDER_NUMBER'])
+    data['CARRIER_STATUS'] = pd.Categorical(result) if categorical else result
+    
+    return data
+
+# Used in classify, the DISTRIBUTION_CHANNEL_2 of each (BILL_TO_NAME, SALES_CHANNEL) pair like calc_distribution_channel_2.
+# Customers can be mapped without changing code, e.g., channel_map = channels.ChannelMap.from_file('Channel Map.csv')
+fsd_channels = ["DISTRIBUTORS", "FIELD SALES", "OTHER", "INTERNATIONAL"]
+channel_map = channels.ChannelMap(
+    names={
+        'LOWES COMPANIES INC': 'LOWES',
+        'HOME DEPOT.COM': 'HOME DEPOT.COM',
+        'HOME DEPOT': 'HOME DEPOT',
+        'ACE HDW CORP': 'ACE HDW',
+        'ORGILL INC': 'ORGILL'
+    },
+    contains=[('MENARDS', 'MENARDS')],
+    sales_channels=dict({x: 'DISTRIBUTORS&FIELD SALES' for x in fsd_channels}, ECOMMERCE='ECOMMERCE'),
+    pairs={('PARAMIT MALAYSIA SDN BHD.', x): 'Not Consumer' for x in fsd_channels},
+    default='Not Consumer'
+)
+
+# Used in classify
+def choose(conditions, choices, default, categorical=False):
+    """Like numpy.select for string choices, returns a pandas.Categorical if categorical."""
+    
+    if not categorical:
+        return np.select(conditions, choices, default=default)
+    
+    categories = sorted(set(choices + [default]))
+    codes = np.select(conditions, [categories.index(x) for x in choices], default=categories.index(default))
+    return pd.Categorical.from_codes(codes, categories)
+
+# Vectorized equivalent of the calc_* functions above, which remain the reference implementation.
+@instrument.measured()
+def classify(data, carrier_status, categorical=False, mapping=None):
+    """Adds the four derived distribution columns to data in one column-wise pass.
+    
+        Comparisons are made with criteria masks, so categorical columns are compared once per
+        category rather than once per line.
+    
+        Args:
+            data(pandas.DataFrame): Open_Orders_Extract data, columns are added in place.
+            carrier_status(pandas.DataFrame): Carrier status table from get_carrier_status.
+            categorical(bool): Add the columns as categories, e.g., for data read with a schema.
+            mapping(channels.ChannelMap): Map of DISTRIBUTION_CHANNEL_2, defaults to channel_map.
+            
+        Returns:
+            data(pandas.DataFrame): Data with DISTRIBUTION_CHANNEL_1, DISTRIBUTION_CHANNEL_2,
+                CARRIER_STATUS and DISTRIBUTION_STATUS columns.
+    """
+    
+    def mask(criteria_):
+        return criteria_.mask(data)
+    
+    paramit = mask(Col('BILL_TO_NAME') == 'PARAMIT MALAYSIA SDN BHD.')
+    
+    # calc_distribution_channel_1
+    consumer_channels = ["DISTRIBUTORS", "FIELD SALES", "GIANTS" , "ECOMMERCE", "INTERNATIONAL", "OTHER"]
+    is_ok_consumer = mask(Col('ORG') == 'OK') & mask(Col('SALES_CHANNEL').isin(consumer_channels)) & ~paramit
+    data['DISTRIBUTION_CHANNEL_1'] = choose([is_ok_consumer], ['OK Consumer'], 'Other', categorical)
+    
+    # calc_distribution_channel_2, each distinct (BILL_TO_NAME, SALES_CHANNEL) pair is mapped once
+    mapping = channel_map if mapping is None else mapping
+    data['DISTRIBUTION_CHANNEL_2'] = mapping(data['BILL_TO_NAME'], data['SALES_CHANNEL'], categorical)
+    
+    # calc_carrier_status
+    attach_carrier_status(data, carrier_status, categorical)
+    
+    # calc_distribution_status
+    short = mask(Col('SHORTAGE_CATEGORY') == 'Short')
+    covered = mask(Col('SHORTAGE_CATEGORY') == 'Covered')
+    awaiting = mask(Col('LINE_STATUS') == 'Awaiting')
+    ready = mask(Col('LINE_STATUS') == 'Ready')
+    released = mask(Col('LINE_STATUS') == 'Released')
+    picked = mask(Col('LINE_STATUS') == 'Picked')
+    conditions = [mask(Col('CARRIER_STATUS') == 'Carrier Delay'),
+                  mask(Col('CARRIER_STATUS') == 'Overage'),
+                  mask(Col('CARRIER_STATUS') == 'Transportation Management Delay'),
+                  (short & ~(released | picked)) | awaiting,
+                  covered & ~(ready | released | picked | awaiting),
+                  covered & ready,
+                  released,
+                  picked]
+    choices = ['Carrier Delay', 'Overage', 'Transportation Management Delay', 'Shortage',
+               'Covered - Not Ready', 'Covered - Ready', 'Released', 'Picked']
+    data['DISTRIBUTION_STATUS'] = choose(conditions, choices, 'Other', categorical)
+    
+    return data
+
 # Used in program_1
+@instrument.measured()
 def process_1(report_location='Backlog_Report.xlsx'):
     """Read Backlog_Report and write data into Backlog Breakdown."""
     
-    yesterday_kwargs = {
-                        'spreadsheetId': distribution_spreadsheets['Backlog Breakdown'],
-                        'range': 'B3:B47'
-                       }
-    
-    yesterday = spreadsheets.service().spreadsheets().values().get(**yesterday_kwargs).execute()['values']
-      
-    yesterday_request_kwargs = {
-                                'spreadsheetId': distribution_spreadsheets['Backlog Breakdown'],
-                                'range': 'J3:J47',
-                                'valueInputOption': 'USER_ENTERED',
-                                'body': {'values': yesterday}                                
-                               }
+    spreadsheet_id = distribution_spreadsheets['Backlog Breakdown']
     
-    yesterday_request = spreadsheets.service().spreadsheets().values().update(**yesterday_request_kwargs).execute()
+    yesterday = spreadsheets.get(spreadsheet_id, 'B3:B47')['values']
+    yesterday_request = spreadsheets.update(spreadsheet_id, 'J3:J47', yesterday)
     
     return yesterday_request
 
 # Used in program_2
-def process_2(report_location='Backlog.xlsx'):
-    """Calculate Late Dropships."""
+@instrument.measured()
+def process_2(report_location='Backlog.xlsx', data=None):
+    """Calculate Late Dropships, from data if the Backlog report was already read."""
     
-    process_2_data = read('Backlog', report_location)
+    process_2_data = read('Backlog', report_location, usecols=backlog_columns) if data is None else data
+    instrument.add(rows=len(process_2_data))
     result = {}
     
     late_dropships = process_2_data.query('`Shipping Org` == "OK"')
@@ -224,57 +673,61 @@ def process_2(report_location='Backlog.xlsx'):
     return result
 
 # Used in program_1
-def process_3(report_location='Open_Orders_Extract.xlsx'):
-    """Lists late trucks in order by dollar value"""
+@instrument.measured()
+def process_3(report_location='Open_Orders_Extract.xlsx', data=None, compact=False):
+    """Lists late trucks in order by dollar value, from data if the Open Orders report was already read"""
     
-    oorex = read('Open_Orders_Extract', report_location)
-    select_data = oorex.query('SHIP_DATE_CATEGORY == "Late"')
-    select_data = select_data.query('ORG == "OK"')
-    select_data = select_data.query('SHIPPING_CATEGORY == "TRUCK"')
-    select_data = select_data.query('SALES_CHANNEL in ["DISTRIBUTORS", "FIELD SALES", "GIANTS" , "ECOMMERCE"]')
-    pivot = pd.pivot_table(select_data, values='DOLLARS', index=['ORDER_NUMBER', 'BILL_TO_NAME', 'SHIP_TO_NAME'], aggfunc=sum)
+    if data is None:
+        schema = open_orders_schema if compact else None
+        data = read('Open_Orders_Extract', report_location, usecols=open_orders_columns, schema=schema)
+    instrument.add(rows=len(data))
+    select_data = sift(data, late_truck)
+    pivot = pd.pivot_table(select_data, values='DOLLARS', index=late_truck_index, aggfunc=sum, observed=True)
     
     return pivot.sort_values('DOLLARS', ascending=False)
 
 # Used in program_2
-def process_4(report_location='Open_Orders_Extract.xlsx'):
-    """Reads Open Orders report, categorizes lines, exports and returns data"""
-    
-    data = read('Open_Orders_Extract', report_location)
-    carrier_status = get_carrier_status()
-    data['DISTRIBUTION_CHANNEL_1'] = data.apply(calc_distribution_channel_1, axis=1)
-    data['DISTRIBUTION_CHANNEL_2'] = data.apply(calc_distribution_channel_2, axis=1)
-    data['CARRIER_STATUS'] = data.apply(calc_carrier_status, axis=1, carrier_status=carrier_status)
-    data['DISTRIBUTION_STATUS'] = data.apply(calc_distribution_status, axis=1)
-    select_columns = ['DISTRIBUTION_CHANNEL_1',
-                      'DISTRIBUTION_CHANNEL_2',
-                      'DISTRIBUTION_STATUS',
-                      'SHIP_DATE_CATEGORY', 
-                      'ORDER_NUMBER',
-                      'DOLLARS',
-                      'CASES',
-                      'ORG',
-                      'SALES_CHANNEL',
-                      'BILL_TO_NAME',
-                      'SHIP_TO_NAME',
-                      'SHIP_DATE',
-                      'SHIPPING_METHOD',
-                      'SHIPPING_CATEGORY',
-                      'LINE_STATUS',
-                      'CARRIER_STATUS',
-                      'SHORTAGE_CATEGORY',
-                      'ITEM_NO',
-                      'ITEM_DESCRIPTION',
-                      'PIECE_QTY',
-                      'Open Orders',
-                      'DISTRIBUTION_ONHAND',
-                      'RESERVED_QUANTITY']
-    
-    data = data[select_columns]
-    data.to_excel('Line Detail.xlsx', sheet_name='Line Detail', index=False)
+@instrument.measured()
+def process_4(report_location='Open_Orders_Extract.xlsx', data=None, carrier_status=None, compact=False,
+              formats=('xlsx',), workers=None):
+    """Reads Open Orders report, categorizes lines, exports and returns data
+    
+        data and carrier_status can be passed when already read, data is not changed. If compact,
+        the report is read with open_orders_schema and the derived columns are categories.
+        Line Detail is exported in the background in each of formats from its own copy, so the
+        returned data can be changed while it runs, see exporting.wait.
+        Large reports are categorized in worker processes, see parallel.classify.
+    """
+    
+    if data is None:
+        schema = open_orders_schema if compact else None
+        data = read('Open_Orders_Extract', report_location, usecols=open_orders_columns, schema=schema)
+    else:
+        data = data.copy(deep=False)
+    if carrier_status is None:
+        carrier_status = get_carrier_status()
+    data = parallel.classify(data, carrier_status, categorical=compact, workers=workers)
+    data = data[line_detail_columns]
+    for file_format in formats:
+        exporting.export_later(data, 'Line Detail.' + file_format)
 
     return data
 
+# Used in program_1 and main
+def display(value):
+    """Shows value with IPython.display in a notebook, or prints it otherwise.
+    
+        IPython is never imported here, it is only used when the code already runs in IPython.
+    """
+    
+    ipython = sys.modules.get('IPython')
+    if ipython is not None and ipython.get_ipython() is not None:
+        from IPython.display import display as show
+        show(value)
+    else:
+        print(value)
+
+@instrument.measured()
 def program_1():
     """Runs processes 1 and 3."""
     
@@ -284,85 +737,79 @@ def program_1():
     display(p1_request)
     display(late_trucks.head(60))
 
-def program_2():
-    """Runs processes 2 and 4 and updates Backlog Breakdown Google Sheet."""
+@instrument.measured()
+def program_2(workers=None):
+    """Runs processes 2 and 4 and updates Backlog Breakdown Google Sheet.
+    
+        worker processes categorize and total large reports, see parallel.worker_processes.
+    """
     
     dropships = process_2()
-    p4_data = process_4()
-    
-    data = [
-            {'range': 'Current!B6:B10',
-             'values': [[sift_dollars(p4_data, ok_consumer, backlog, ace, shortage)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, ace, covered_ready)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, ace, picked)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, ace, released)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, ace, customer_transportation)]
-                       ]},
-            {'range': 'Current!B12:B21',
-             'values': [[sift_dollars(p4_data, ok_consumer, backlog, kilgore, shortage)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, kilgore, covered_ready)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, kilgore, picked)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, kilgore, released)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, kilgore, customer_transportation)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, orgill, not_kilgore, shortage)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, orgill, not_kilgore, covered_ready)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, orgill, not_kilgore, picked)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, orgill, not_kilgore, released)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, orgill, not_kilgore, covered_not_ready) + dropships['Orgill']]
-                       ]},
-            {'range': 'Current!B23:B28',
-             'values': [[sift_dollars(p4_data, ok_consumer, backlog, fsd, shortage)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, fsd, covered_ready)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, fsd, picked)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, fsd, released)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, fsd, customer_transportation)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, fsd, covered_not_ready) + dropships['FSD']]
-                       ]},
-            {'range': 'Current!B30',
-             'values': [[sift_dollars(p4_data, ok_consumer, backlog, ecommerce, shortage)]
-                       ]},            
-            {'range': 'Current!B33:35',
-             'values': [[sift_dollars(p4_data, ok_consumer, backlog, lowes, overage)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, lowes, carrier_delay)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, lowes, t_m_delay)],
-                       ]},
-            {'range': 'Current!B39:42',
-             'values': [[sift_dollars(p4_data, ok_consumer, backlog, home_depot, overage)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, home_depot, carrier_delay)],
-                        [sift_dollars(p4_data, ok_consumer, backlog, home_depot, t_m_delay)],
-                       ]},
-            {'range': 'Current!B44',
-             'values': [[sift_dollars(p4_data, ok_consumer, backlog, menards, shortage)]
-                       ]}        
-           ]
-    
-    body = {
-            'valueInputOption': 'USER_ENTERED',
-            'data': data
-           }
-
-    kwargs = {
-              'spreadsheetId': distribution_spreadsheets['Backlog Breakdown'],
-              'body': body
-             }
-
-    spreadsheets.service().spreadsheets().values().batchUpdate(**kwargs).execute()
+    p4_data = process_4(workers=workers)
+    update_backlog_breakdown(dropships, p4_data, workers=workers)
+    exporting.wait()
+
+# Used in update_backlog_breakdown
+def backlog_breakdown_totals(p4_data, workers=None):
+    """Returns the Current cell values and OK Consumer Backlog pivots of Backlog Breakdown.
     
-    select_data = sift(p4_data, ok_consumer, backlog)
-    table1 = pd.pivot_table(select_data, values='DOLLARS', index='DISTRIBUTION_CHANNEL_2', aggfunc=sum)
-    spreadsheets.update(
-        distribution_spreadsheets['Backlog Breakdown'],
-        'OK Consumer Backlog!A3',
-        spreadsheets.values(table1, index=True)
-    )
+        Large p4_data is totaled in worker processes, see parallel.backlog_breakdown_totals.
+    
+        Returns:
+            result(dict): 'cells' from report_dollars, 'channels' and 'statuses' DOLLARS pivots
+                by DISTRIBUTION_CHANNEL_2 and DISTRIBUTION_STATUS.
+    """
+    
+    if parallel.worker_count(len(p4_data), workers) > 1:
+        return parallel.backlog_breakdown_totals(p4_data, workers)
     
     select_data = sift(p4_data, ok_consumer, backlog)
-    table1 = pd.pivot_table(select_data, values='DOLLARS', index='DISTRIBUTION_STATUS', aggfunc=sum)
-    spreadsheets.update(
-        distribution_spreadsheets['Backlog Breakdown'],
-        'OK Consumer Backlog!A19',
-        spreadsheets.values(table1, index=True)
-    )
+    
+    return {
+        'cells': report_dollars(p4_data, backlog_breakdown_cells),
+        'channels': pd.pivot_table(select_data, values='DOLLARS', index='DISTRIBUTION_CHANNEL_2', aggfunc=sum, observed=True),
+        'statuses': pd.pivot_table(select_data, values='DOLLARS', index='DISTRIBUTION_STATUS', aggfunc=sum, observed=True)
+    }
+
+# Used in update_backlog_breakdown
+def backlog_breakdown_updates(dropships, totals):
+    """Returns the values list written to each Backlog Breakdown range, see update_backlog_breakdown."""
+    
+    updates = {range_: [list(row) for row in rows] for range_, rows in totals['cells'].items()}
+    updates['Current!B12:B21'][-1][0] += dropships['Orgill']
+    updates['Current!B23:B28'][-1][0] += dropships['FSD']
+    updates['OK Consumer Backlog!A3'] = spreadsheets.values(totals['channels'], index=True)
+    updates['OK Consumer Backlog!A19'] = spreadsheets.values(totals['statuses'], index=True)
+    
+    return updates
+
+# Used in program_2 and main
+@instrument.measured()
+def update_backlog_breakdown(dropships, p4_data=None, totals=None, previous=None, workers=None):
+    """Writes the Current cells and OK Consumer Backlog pivots of Backlog Breakdown.
+    
+        totals from backlog_breakdown_totals, or streaming.stream, can be passed instead of p4_data.
+        Ranges whose values are the same as in previous, the updates of an earlier run, are skipped.
+        
+        Returns:
+            updates(dict): Range name to values list of every range, written or not.
+    """
+    
+    if totals is None:
+        totals = backlog_breakdown_totals(p4_data, workers)
+    
+    updates = backlog_breakdown_updates(dropships, totals)
+    spreadsheet_id = distribution_spreadsheets['Backlog Breakdown']
+    
+    def rounded(values):
+        return [[round(x, 6) if isinstance(x, float) else x for x in row] for row in values]
+    
+    with spreadsheets.SheetBatch() as batch:
+        for range_, values in updates.items():
+            if previous is None or range_ not in previous or rounded(previous[range_]) != rounded(values):
+                batch.update(spreadsheet_id, range_, values)
+    
+    return updates
 
 # Not in use.
 # def breakdown(report_location='Backlog_Report.xlsx'):
@@ -408,9 +855,40 @@ def program_2():
 #
 #    request = spreadsheets.service().spreadsheets().values().batchUpdate(**request_kwargs).execute()
     
-def main():
-    program_1()
-    program_2()
+def main(concurrent=True):
+    """Runs programs 1 and 2, with independent stages at the same time if concurrent.
+    
+        Excel files are parsed in processes and sheets requests are made in threads, the Open
+        Orders report is read once, compacted with open_orders_schema, for processes 3 and 4.
+    """
+    
+    instrument.reset()
+    if not concurrent:
+        program_1()
+        program_2()
+        instrument.report(run_report)
+        return
+    
+    run_stages = [
+        stages.Stage('process_1', process_1),
+        stages.Stage('carrier_status', get_carrier_status),
+        stages.Stage('backlog', functools.partial(read, 'Backlog', 'Backlog.xlsx', usecols=backlog_columns), pool='process'),
+        stages.Stage('open_orders', functools.partial(read, 'Open_Orders_Extract', 'Open_Orders_Extract.xlsx', usecols=open_orders_columns, schema=open_orders_schema), pool='process'),
+        stages.Stage('process_2', lambda data: process_2(data=data), ['backlog']),
+        stages.Stage('process_3', lambda data: process_3(data=data), ['open_orders']),
+        stages.Stage('process_4', lambda data, carrier_status: process_4(data=data, carrier_status=carrier_status, compact=True), ['open_orders', 'carrier_status']),
+        # process_1 copies the Current column to yesterday, it must be read before it is updated
+        stages.Stage('update_backlog_breakdown', lambda dropships, p4_data, p1_request: update_backlog_breakdown(dropships, p4_data),
+                     ['process_2', 'process_4', 'process_1'])
+    ]
+    results, timings = stages.run(run_stages)
+    for export in exporting.wait():
+        timings['export ' + export['format']] = export['seconds']
+    
+    display(results['process_1'])
+    display(results['process_3'].head(60))
+    display(pd.Series(timings, name='Seconds'))
+    instrument.report(run_report)
 
 if __name__ == "__main__":
     main()